@@ -0,0 +1,175 @@
+"""
+Run the micro-benchmarks of the framework hot paths.
+
+    python -m benchmarks run                      # print the results
+    python -m benchmarks save [--name NAME]       # store them as a JSON baseline
+    python -m benchmarks compare [--name NAME]    # fail if a scenario got slower than the baseline
+    python -m benchmarks startup                  # -X importtime breakdown of `import osa` and `osa --help`
+    python -m benchmarks allocations [-k NAME]    # memory allocated and GC runs per operation
+
+Baselines live in benchmarks/baselines/<name>.json. They depend on the machine, so
+compare against a baseline saved on the same machine (e.g. from the main branch).
+"""
+
+import json
+import os
+import platform
+import sys
+import timeit
+import click
+import gc
+import tracemalloc
+from .scenarios import SCENARIOS
+from .startup import COMMANDS, import_times
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def measure(op, repeat=5, min_time=0.2):
+    """
+    Best time of one operation in nanoseconds, the minimum is the least noisy estimate.
+    """
+    timer = timeit.Timer(op)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def run_scenarios(names=None, repeat=5):
+    results = {}
+    for name, setup in SCENARIOS.items():
+        if names and name not in names:
+            continue
+        results[name] = {"ns_per_op": round(measure(setup(), repeat=repeat), 1)}
+    return results
+
+
+def compare(baseline, current, threshold):
+    """
+    Returns a list of (name, baseline ns, current ns, ratio, regressed).
+    """
+    rows = []
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["ns_per_op"]
+        after = result["ns_per_op"]
+        ratio = after / before if before else float("inf")
+        rows.append((name, before, after, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def measure_allocations(op, number=2000):
+    """
+    (average bytes allocated at the peak of one operation, gen0 collections per 10k operations)
+    """
+    op()
+    gc.collect()
+    collections = gc.get_stats()[0]["collections"]
+    for _ in range(number):
+        op()
+    gc_runs = (gc.get_stats()[0]["collections"] - collections) * 10000 / number
+    tracemalloc.start()
+    try:
+        total = 0
+        for _ in range(number):
+            if hasattr(tracemalloc, "reset_peak"):
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+            else:
+                # Before Python 3.9 clearing the traces is the only way to reset the peak
+                tracemalloc.clear_traces()
+                current = 0
+            op()
+            total += tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+    return total / number, gc_runs
+
+
+def baseline_path(name):
+    return os.path.join(BASELINES_DIR, f"{name}.json")
+
+
+@click.group()
+def cli():
+    """Micro-benchmarks for the Osa hot paths."""
+
+
+@cli.command()
+@click.option('--scenario', '-k', 'names', multiple=True, help='Only run these scenarios.')
+@click.option('--repeat', default=5, help='Number of repetitions per scenario.')
+def run(names, repeat):
+    """Run the scenarios and print the results."""
+    for name, result in run_scenarios(names, repeat).items():
+        click.echo(f"{name:<24} {result['ns_per_op']:>14,.1f} ns/op")
+
+
+@cli.command()
+@click.option('--name', default='default', help='Name of the baseline.')
+@click.option('--repeat', default=5, help='Number of repetitions per scenario.')
+def save(name, repeat):
+    """Run the scenarios and store the results as a baseline."""
+    results = run_scenarios(repeat=repeat)
+    os.makedirs(BASELINES_DIR, exist_ok=True)
+    data = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scenarios": results,
+    }
+    with open(baseline_path(name), "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    click.echo(f"Saved {len(results)} scenarios to {baseline_path(name)}")
+
+
+@cli.command("compare")
+@click.option('--name', default='default', help='Name of the baseline.')
+@click.option('--threshold', default=0.25, help='Allowed slowdown, 0.25 means 25% slower.')
+@click.option('--scenario', '-k', 'names', multiple=True, help='Only run these scenarios.')
+@click.option('--repeat', default=5, help='Number of repetitions per scenario.')
+def compare_command(name, threshold, names, repeat):
+    """Run the scenarios and fail if one regressed past the threshold."""
+    path = baseline_path(name)
+    if not os.path.exists(path):
+        raise click.UsageError(f"No baseline at {path}, create one with 'python -m benchmarks save'.")
+    with open(path) as f:
+        baseline = json.load(f)["scenarios"]
+    rows = compare(baseline, run_scenarios(names, repeat), threshold)
+    regressions = 0
+    for scenario_name, before, after, ratio, regressed in rows:
+        regressions += regressed
+        flag = click.style("REGRESSED", fg="red") if regressed else "ok"
+        click.echo(f"{scenario_name:<24} {before:>14,.1f} -> {after:>14,.1f} ns/op  {ratio:6.2f}x  {flag}")
+    if regressions:
+        click.secho(f"{regressions} scenario(s) slower than {1 + threshold:.2f}x the baseline.", fg="red")
+        sys.exit(1)
+
+
+@cli.command("allocations")
+@click.option('--scenario', '-k', 'names', multiple=True, help='Only run these scenarios.')
+@click.option('--number', default=2000, help='Operations per scenario.')
+def allocations_command(names, number):
+    """Show the memory allocated and the GC runs per operation."""
+    for name, setup in SCENARIOS.items():
+        if (names and name not in names) or name.startswith("startup_"):
+            continue
+        peak, gc_runs = measure_allocations(setup(), number)
+        click.echo(f"{name:<28} {peak:>12,.0f} B/op peak {gc_runs:>8.1f} gen0 GCs/10k ops")
+
+
+@cli.command("startup")
+@click.option('--top', default=15, help='Number of modules to show.')
+def startup_command(top):
+    """Show the slowest imports of `import osa` and `osa --help`."""
+    for name in COMMANDS:
+        rows = import_times(name)
+        root = COMMANDS[name][2]
+        cumulative = next(cumulative_us for module, _, cumulative_us in rows if module == root)
+        total = sum(self_us for _, self_us, _ in rows)
+        click.secho(f"{name}: {root} {cumulative / 1000:.1f} ms, all imports {total / 1000:.1f} ms", bold=True)
+        for module, self_us, cumulative_us in rows[:top]:
+            click.echo(f"  {module:<40} {self_us / 1000:>8.2f} ms self {cumulative_us / 1000:>8.2f} ms cumulative")
+
+
+if __name__ == "__main__":
+    cli()
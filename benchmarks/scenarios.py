@@ -0,0 +1,132 @@
+"""
+Micro-benchmark scenarios for the framework hot paths.
+
+Every scenario is a setup function registered with @scenario. The setup builds what the
+scenario needs (apps, routers, files...) and returns the operation to time, a callable
+without arguments that does one unit of work.
+"""
+
+import os
+import tempfile
+from webob import Request
+from osa import Osa, response
+from osa.testing import build_environ
+from osa.ctx import RequestContext, ResponseContext
+from osa.router import Router
+from osa.static_file_handler import StaticFileHandler
+from osa.template_engine import TemplateEngine
+from .startup import COMMANDS, startup
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def decorator(setup):
+        SCENARIOS[name] = setup
+        return setup
+    return decorator
+
+
+def make_router(size):
+    router = Router()
+    for i in range(size):
+        router.add_route(f"/section{i}/{{item_id}}", lambda item_id: None, ["GET"])
+    return router
+
+
+def router_match(size):
+    router = make_router(size)
+    # The last route is the worst case of a linear search
+    path = f"/section{size - 1}/42"
+    return lambda: router.match(path)
+
+
+for _size in (1, 100, 1000):
+    scenario(f"router_match_{_size}")(lambda size=_size: router_match(size))
+
+
+@scenario("context_push_pop")
+def context_push_pop():
+    environ = build_environ("GET", "/")
+
+    def op():
+        ctx = RequestContext.acquire(environ)
+        ctx.push()
+        res_ctx = ResponseContext.acquire()
+        res_ctx.push()
+        res_ctx.pop()
+        res_ctx.release()
+        ctx.pop()
+        ctx.release()
+    return op
+
+
+@scenario("context_push_pop_unpooled")
+def context_push_pop_unpooled():
+    # What every request did before the contexts were recycled, to compare with context_push_pop
+    environ = build_environ("GET", "/")
+
+    def op():
+        ctx = RequestContext(environ)
+        ctx.push()
+        res_ctx = ResponseContext()
+        res_ctx.push()
+        res_ctx.pop()
+        ctx.pop()
+    return op
+
+
+def static_serve(cache_enabled):
+    static_dir = tempfile.mkdtemp(prefix="osa-bench-static-")
+    with open(os.path.join(static_dir, "style.css"), "w") as f:
+        f.write("body { color: #333; }\n" * 200)
+    handler = StaticFileHandler(static_dir, cache_enabled=cache_enabled)
+    environ = build_environ("GET", "/static/style.css")
+    environ["HTTP_ACCEPT_ENCODING"] = "gzip"
+    return lambda: handler.serve("/style.css", Request(environ))
+
+
+scenario("static_uncached")(lambda: static_serve(False))
+scenario("static_cached")(lambda: static_serve(True))
+
+
+def template_render(source, context):
+    templates_dir = tempfile.mkdtemp(prefix="osa-bench-templates-")
+    with open(os.path.join(templates_dir, "page.html"), "w") as f:
+        f.write(source)
+    engine = TemplateEngine(templates_dir)
+    return lambda: engine.render("page.html", context)
+
+
+scenario("template_small")(lambda: template_render("<h1>Hello, {{ name }}</h1>", {"name": "Osa"}))
+scenario("template_large")(lambda: template_render(
+    "<table>{% for row in rows %}<tr><td>{{ row.id }}</td><td>{{ row.name|e }}</td></tr>{% endfor %}</table>",
+    {"rows": [{"id": i, "name": f"<item {i}>"} for i in range(1000)]},
+))
+
+
+def round_trip(path):
+    static_dir = tempfile.mkdtemp(prefix="osa-bench-static-")
+    with open(os.path.join(static_dir, "style.css"), "w") as f:
+        f.write("body { color: #333; }\n")
+    app = Osa(templates_dir=tempfile.gettempdir(), static_dir=static_dir, debug=False)
+
+    @app.route("/hello/{name}")
+    def hello(name):
+        response.text = f"Hello, {name}!"
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def op():
+        for _ in app(build_environ("GET", path), start_response):
+            pass
+    return op
+
+
+scenario("wsgi_round_trip")(lambda: round_trip("/hello/osa"))
+scenario("wsgi_static_round_trip")(lambda: round_trip("/static/style.css"))
+
+
+for _name in COMMANDS:
+    scenario(f"startup_{_name}")(lambda name=_name: startup(name))
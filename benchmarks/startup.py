@@ -0,0 +1,55 @@
+"""
+Startup cost of `import osa` and of the `osa` CLI, measured in a fresh interpreter.
+
+The wall-clock time is tracked by the startup_* scenarios, and
+`python -m benchmarks startup` shows the `python -X importtime` breakdown
+to find which import got expensive.
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (code, arguments, module whose cumulative import time is reported)
+COMMANDS = {
+    "import_osa": ("import osa", [], "osa"),
+    "cli_help": ("from osa.cli import main; main()", ["--help"], "osa.cli"),
+}
+
+
+def run_python(code, args=(), importtime=False):
+    """
+    Run `code` in a new interpreter and return its stderr.
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", code, *args]
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, check=True)
+    return result.stderr.decode()
+
+
+def import_times(name):
+    """
+    Returns [(module, self us, cumulative us)] from `python -X importtime`, slowest first.
+    """
+    code, args, _ = COMMANDS[name]
+    rows = []
+    for line in run_python(code, args, importtime=True).splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def startup(name):
+    """
+    Scenario operation: start an interpreter and run the command.
+    """
+    code, args, _ = COMMANDS[name]
+    return lambda: run_python(code, args)
@@ -1,3 +1,20 @@
-from .app import Osa
+import sys
 from .exceptions import abort 
-from .globals import request, response
+from .globals import request, response, session
+
+__all__ = ["Osa", "abort", "request", "response", "session"]
+
+
+def __getattr__(name):
+    # Osa pulls in webob and the router, import it only when it is used
+    # so `import osa.cli` or `from osa import request` stay cheap.
+    # (`globals` is the osa.globals submodule here, hence sys.modules)
+    if name == "Osa":
+        from .app import Osa
+        setattr(sys.modules[__name__], name, Osa)
+        return Osa
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(vars(sys.modules[__name__])) | set(__all__))
@@ -0,0 +1,164 @@
+"""
+A non-blocking access log for Osa.
+
+Calling `logger.info` in an after_request hook writes to a file on the request thread,
+so a slow disk adds latency to every response. AccessLogger does the I/O elsewhere:
+
+1. The request thread only builds a small tuple (method, path, route, status, bytes, duration)
+   and puts it in a bounded queue, it never waits:
+   - when the queue is full the record is dropped and counted in `dropped`.
+   - with sample_rate < 1 only that fraction of the requests is logged.
+   - the record is queued when the server closes the response: `bytes` is the size of the
+     body actually sent (after compression, streamed bodies included) and `duration_ms`
+     runs until its last chunk.
+2. A writer thread takes the records from the queue, formats them as JSON lines and
+   writes them in batches (up to batch_size records), flushing the file at most
+   every flush_interval seconds.
+
+The writer thread is started on the first request of each process, so the logger
+also works in the workers of the pre-fork server. The queued records are written at exit
+(atexit) and, in the workers of the pre-fork server, which exit with os._exit(), when the
+worker stops (SIGTERM, reload).
+"""
+
+import atexit
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+_STOP = object()
+
+
+def format_record(record):
+    timestamp, method, path, route, status, size, duration = record
+    return json.dumps({
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp)) + f".{int(timestamp % 1 * 1000):03d}Z",
+        "method": method,
+        "path": path,
+        "route": route,
+        "status": status,
+        "bytes": size,
+        "duration_ms": round(duration * 1000, 3),
+    }, separators=(",", ":")) + "\n"
+
+
+class AccessLogger:
+    def __init__(self, app=None, stream=None, path=None, queue_size=10000, batch_size=512,
+                 flush_interval=1.0, sample_rate=1.0, formatter=format_record):
+        self.stream = stream
+        self.path = path
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.formatter = formatter
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # Threads do not survive fork(), a worker starts its own writer
+            os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.close)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.access_log = self
+
+    def log(self, environ, status, size, duration):
+        """
+        Queue a record for a finished request. Never blocks.
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if self._thread is None:
+            self._start()
+        record = (
+            time.time(),
+            environ.get("REQUEST_METHOD"),
+            environ.get("PATH_INFO"),
+            environ.get("osa.route"),
+            status,
+            size,
+            duration,
+        )
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="osa-access-log", daemon=True)
+            self._thread.start()
+
+    def _after_fork(self):
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _open(self):
+        if self.stream is not None:
+            return self.stream, False
+        if self.path is not None:
+            return open(self.path, "a", buffering=1024 * 1024), True
+        return sys.stdout, False
+
+    def _run(self):
+        stream, owned = self._open()
+        get = self._queue.get
+        last_flush = time.monotonic()
+        unflushed = False
+        try:
+            while True:
+                try:
+                    record = get(timeout=self.flush_interval)
+                except queue.Empty:
+                    if unflushed:
+                        stream.flush()
+                        unflushed = False
+                    last_flush = time.monotonic()
+                    continue
+                batch = []
+                while record is not _STOP:
+                    batch.append(self.formatter(record))
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        record = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    stream.write("".join(batch))
+                    unflushed = True
+                if record is _STOP or time.monotonic() - last_flush >= self.flush_interval:
+                    stream.flush()
+                    unflushed = False
+                    last_flush = time.monotonic()
+                if record is _STOP:
+                    return
+        finally:
+            if owned:
+                stream.close()
+
+    def close(self, timeout=5):
+        """
+        Write the queued records and stop the writer thread.
+        """
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+        self._thread = None
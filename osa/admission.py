@@ -0,0 +1,198 @@
+"""
+Overload protection for Osa applications.
+
+Two independent tools live here:
+
+1. AdmissionController:
+   - Caps the number of requests the app processes at the same time (max_in_flight).
+     A request keeps its slot until the server closes its body, so a streamed response
+     counts until its last chunk is sent.
+   - Extra requests wait in a bounded queue (max_queue) for at most queue_timeout seconds.
+   - When the queue is full or the deadline passes, the request is answered right away
+     with a pre-rendered 503 and a Retry-After header, without touching the router.
+
+2. RateLimiter:
+   - A token bucket per key (client address by default), kept in memory.
+   - Can be used globally as a before_request hook or per route as a decorator.
+   - Requests over the limit get a 429 with a Retry-After header.
+
+Read more about load shedding and token buckets here:
+    https://en.wikipedia.org/wiki/Token_bucket
+    https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Retry-After
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from .exceptions import abort
+from .globals import request, response
+
+
+class AdmissionController:
+    def __init__(self, app=None, max_in_flight=64, max_queue=0, queue_timeout=1.0, retry_after=1):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+        # The 503 is rendered once, shedding load must be cheaper than serving it.
+        self._status = "503 Service Unavailable"
+        self._body = b"503 Service Unavailable: the server is overloaded, retry later.\n"
+        self._headers = [
+            ("Content-Type", "text/plain; charset=UTF-8"),
+            ("Content-Length", str(len(self._body))),
+            ("Retry-After", str(retry_after)),
+        ]
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Enable admission control for the given app.
+        """
+        app.admission = self
+
+    def acquire(self):
+        """
+        Reserve a slot for a request. Returns False if the request must be shed.
+        """
+        with self._cond:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return True
+            if self.waiting >= self.max_queue or self.queue_timeout <= 0:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        """
+        Free the slot taken by `acquire` and wake up one waiting request.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def reject(self, environ, start_response):
+        """
+        WSGI response used for shed requests.
+        """
+        start_response(self._status, list(self._headers))
+        return [self._body]
+
+
+class TokenBucket:
+    """
+    Holds up to `capacity` tokens and refills `rate` tokens per second.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "timestamp")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.timestamp = now
+
+    def consume(self, now, tokens=1):
+        """
+        Take tokens from the bucket. Returns 0 on success, otherwise
+        the number of seconds until enough tokens are available.
+        """
+        elapsed = now - self.timestamp
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.timestamp = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0
+        return (tokens - self.tokens) / self.rate
+
+
+def client_address():
+    """
+    Default rate limit key: the address of the client.
+    """
+    return request.remote_addr or "-"
+
+
+class RateLimiter:
+    """
+    In-memory token bucket rate limiter.
+    E.g. allow each client 10 requests per second with bursts of 20:
+
+    limiter = RateLimiter(rate=10, burst=20)
+    app.before_request(limiter.check)
+
+    Or limit a single route:
+
+    @app.route("/login", methods=["POST"])
+    @limiter.limit
+    def login():
+        ...
+    """
+    def __init__(self, rate, burst=None, key_func=None, max_keys=10000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, math.ceil(rate))
+        self.key_func = key_func or client_address
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """
+        Count one request for `key`. Returns 0 if allowed, otherwise
+        the number of seconds the client should wait.
+        """
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+                # Forget the least recently seen clients so the state stays bounded
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.consume(now)
+
+    def check(self, scope=None):
+        """
+        Abort the current request with 429 if its key is over the limit.
+        """
+        key = self.key_func()
+        if scope is not None:
+            key = (scope, key)
+        retry_after = self.hit(key)
+        if retry_after:
+            response.headers["Retry-After"] = str(math.ceil(retry_after))
+            abort(429)
+
+    def limit(self, f):
+        """
+        Decorator to rate limit a single view function (or a method of a class-based handler).
+        """
+        scope = f"{f.__module__}.{f.__qualname__}"
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            self.check(scope)
+            return f(*args, **kwargs)
+        return decorated
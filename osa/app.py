@@ -1,40 +1,187 @@
 # app.py
-from requests import Session as RequestsSession
-from wsgiadapter import WSGIAdapter as RequestsWSGIAdapter
-from .template_engine import TemplateEngine
-from .static_file_handler import StaticFileHandler
+# The template engine (Jinja2), the static file handler and the test client (requests)
+# are imported on first use, so importing osa and starting workers or the CLI stays cheap.
+from time import perf_counter
+from webob import Request
 from .router import Router
 from .error_handlers import debug_exception_handler 
-from .globals import request , response 
+from .globals import request , response , _timings_ctx_var , _session_ctx_var
 from .ctx import RequestContext , ResponseContext
+from .metrics import PhaseTimings
+from .sessions import SessionSlot
+from .mounts import PrefixTrie, mount_environ
+
+
+class ClosingIterator:
+    """
+    Wraps the body of a response and runs `callbacks` when the server closes it
+    (PEP 3333), after the last chunk was sent. `sent` counts the bytes of the body.
+    """
+    __slots__ = ("_iterable", "_iterator", "_callbacks", "sent")
+
+    def __init__(self, iterable, callbacks):
+        self._iterable = iterable
+        self._iterator = iter(iterable)
+        self._callbacks = callbacks
+        self.sent = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = next(self._iterator)
+        self.sent += len(chunk)
+        return chunk
+
+    def close(self):
+        callbacks, self._callbacks = self._callbacks, ()
+        try:
+            if hasattr(self._iterable, "close"):
+                self._iterable.close()
+        finally:
+            for callback in callbacks:
+                callback()
 
 
 class Osa:
     def __init__(self, templates_dir="templates", static_dir="static",debug=True):
         self.router = Router()  
-        # self.static_file_handler = StaticFileHandler(static_dir)
-        self.static_handler = StaticFileHandler(static_dir)
-        self.templates_env = TemplateEngine(templates_dir)  
+        self.static_dir = static_dir
+        self.templates_dir = templates_dir
+        self._static_handler = None
+        self._templates_env = None
         self.before_request_funcs = []
         self.after_request_funcs = []
         self.error_handlers = {}  
         self.debug = debug
+        self.mounts = PrefixTrie()
+        self._static_mount = None
         self._static_root = "/static" 
+        self.admission = None
+        self.metrics = None
+        self.profiler = None
+        self.sampler = None
+        self.access_log = None
+        self.session_store = None
+        self.compression = None
+        self.memory = None
     
     def wsgi_app(self, environ, start_response):
+        admission = self.admission
+        if admission is not None and not admission.acquire():
+            # Shed the request before doing any work for it
+            return admission.reject(environ, start_response)
+        # The request is in flight until the server closes its body, streamed bodies included
+        on_close = []
+        if admission is not None:
+            on_close.append(admission.release)
+        sampler = self.sampler
+        if sampler is not None:
+            sampler.enter(environ)
+            on_close.append(sampler.leave)
+        memory = self.memory
+        if memory is not None:
+            memory_start = memory.enter()
+        try:
+            profiler = self.profiler
+            if profiler is not None and profiler.wants(environ):
+                result = profiler.profile(self.handle_request, environ, start_response)
+            else:
+                result = self.handle_request(environ, start_response)
+        except BaseException:
+            ClosingIterator((), on_close).close()
+            raise
+        finally:
+            if memory is not None:
+                memory.leave(environ, memory_start)
+        if on_close:
+            return ClosingIterator(result, on_close)
+        return result
+
+    def handle_request(self, environ, start_response):
+        """
+        Handles one request in its own context, everything `wsgi_app` does
+        apart from admission control and profiling.
+        """
+        metrics = self.metrics
+        access_log = self.access_log
+        if metrics is not None or access_log is not None:
+            start = perf_counter()
+        if metrics is not None:
+            timings_token = _timings_ctx_var.set(PhaseTimings())
         ctx = self.request_context(environ)
         try:
             ctx.push()
             response = self.dispatch_request()
-            return response(environ, start_response)
+            if metrics is not None:
+                self.record_metrics(environ, response, start)
+            if self.compression is not None:
+                result = self.compression.respond(response, environ, start_response)
+            else:
+                result = response(environ, start_response)
+            if access_log is None:
+                return result
+            # Logged once the body is sent: the bytes on the wire (compressed, streamed...)
+            status = response.status_code
+            body = ClosingIterator(result, [lambda: access_log.log(environ, status, body.sent, perf_counter() - start)])
+            return body
         finally:
             ctx.pop()
+            ctx.release()
+            if metrics is not None:
+                _timings_ctx_var.reset(timings_token)
             
     def __call__(self, environ, start_response):
         return self.wsgi_app(environ, start_response)
 
     def request_context(self,environ):    
-        return RequestContext(environ)
+        return RequestContext.acquire(environ)
+
+    @property
+    def static_handler(self):
+        if self._static_handler is None:
+            from .static_file_handler import StaticFileHandler
+            self._static_handler = StaticFileHandler(self.static_dir)
+        return self._static_handler
+
+    @static_handler.setter
+    def static_handler(self, handler):
+        self._static_handler = handler
+
+    @property
+    def _static_root(self):
+        return self._static_mount
+
+    @_static_root.setter
+    def _static_root(self, prefix):
+        # Static files are a mount: changing the root moves it
+        if self._static_mount is not None:
+            self.mounts.remove(self._static_mount)
+        self.mounts.insert(prefix, self.serve_static)
+        self._static_mount = prefix
+
+    def is_static_file(self):
+        """
+        Kept for compatibility, static files are served by a mount (see `serve_static`).
+        """
+        return request.path.startswith(self._static_root)
+
+    def cut_static_root(self):
+        """
+        Kept for compatibility: /static/css/style.css -> /css/style.css.
+        """
+        return request.path[len(self._static_root):]
+
+    @property
+    def templates_env(self):
+        if self._templates_env is None:
+            from .template_engine import TemplateEngine
+            self._templates_env = TemplateEngine(self.templates_dir)
+        return self._templates_env
+
+    @templates_env.setter
+    def templates_env(self, engine):
+        self._templates_env = engine
     
     def route(self, rule, methods=None):
         """
@@ -49,29 +196,59 @@ class Osa:
         """
         Dispatches the request to the appropriate handler (view function).
         """
-        res_ctx = ResponseContext()
+        res_ctx = None
+        session_token = None
         try :
             try:
-                if self.is_static_file():
-                    static_path = self.cut_static_root()
-                    return self.static_handler.serve(static_path, request)
-                self.run_before_request()
-                
+                mount = self.mounts.lookup(request.path_info)
+                if mount is not None:
+                    return self.dispatch_mount(*mount)
+                # Static files and mounted apps come with their own response, only routes need one
+                res_ctx = ResponseContext.acquire()
                 res_ctx.push()
+                response = res_ctx.response
+                if self.session_store is not None:
+                    # Only a placeholder, the session is loaded if the view uses it
+                    session_token = _session_ctx_var.set(SessionSlot(self.session_store))
+                timings = _timings_ctx_var.get() if self.metrics is not None else None
+                if timings is not None:
+                    mark = perf_counter()
+                # before_request hooks can already set headers or abort the request
+                self.run_before_request()
+                if timings is not None:
+                    mark = timings.add("before_request", mark)
                 
-                response = res_ctx.current 
                 # Find and run the handler for the route
-                route, kwargs = self.router.match(request.path)
+                route, kwargs = self.router.match(request.path_info or "/")
                 handler = self.router.get_handler(route, request.method)
+                request.environ["osa.route"] = route.rule
+                if timings is not None:
+                    mark = timings.add("routing", mark)
                 # Call the handler with the route parameters
                 handler(**kwargs)                
+                if timings is not None:
+                    mark = timings.add("handler", mark)
                 # Run after request hooks
                 self.run_after_request()
+                if timings is not None:
+                    timings.add("after_request", mark)
             except Exception as e:
+                if res_ctx is None:
+                    # The static handler or a mounted app raised (404, 403...), the error page needs a response
+                    res_ctx = ResponseContext.acquire()
+                    res_ctx.push()
+                    response = res_ctx.response
                 self.handle_exception(e )
+            if session_token is not None:
+                # Written only if it was loaded and modified, error pages included
+                _session_ctx_var.get().save(response)
             return response
         finally :
-            res_ctx.pop()
+            if session_token is not None:
+                _session_ctx_var.reset(session_token)
+            if res_ctx is not None:
+                res_ctx.pop()
+                res_ctx.release()
             
     def handle_exception(self, e):
         """
@@ -87,16 +264,29 @@ class Osa:
             return response 
         debug_exception_handler(response,e)
 
+    def record_metrics(self, environ, response, start):
+        """
+        Feed the finished request to `self.metrics`, and add the Server-Timing header.
+        """
+        timings = _timings_ctx_var.get()
+        route = environ.get("osa.route")
+        duration = perf_counter() - start
+        if self.metrics.server_timing:
+            response.headers["Server-Timing"] = timings.header(duration)
+        self.metrics.observe(route, environ["REQUEST_METHOD"], response.status_code, duration, timings)
+
     def template(self, template_name, context=None):
         return self.templates_env.render(template_name, context)
     
     def after_request(self,fun):
         """
         Register a function to run after each request.
-        E.g. to modify response headers or log requests.
+        E.g. to modify response headers.
         @app.after_request
-        def log_request():
-            logger.info(f"{request.method} - {request.path}")
+        def add_headers():
+            response.headers["X-Framework"] = "Osa"
+        To log requests use `osa.access_log.AccessLogger`, it writes from a
+        background thread instead of doing file I/O on the request thread.
         """
         self.after_request_funcs.append(fun)
         return fun
@@ -135,26 +325,63 @@ class Osa:
         for func in reversed(self.after_request_funcs):
             func()
             
-    def run(self, host="localhost", port=5000):
+    def run(self, host="localhost", port=5000, workers=1, threads=None, engine="wsgiref"):
+        """
+        Run the app. With workers, threads or the "selectors" engine the servers
+        from `osa.server` are used instead of the single threaded wsgiref server.
+        """
+        if workers > 1 or threads or engine != "wsgiref":
+            from .server import serve
+            return serve(self, host, port, workers=workers, threads=threads, engine=engine)
         from wsgiref.simple_server import make_server
         server = make_server(host, port, self)
         print(f"Starting server on http://{host}:{port}")
         server.serve_forever() 
 
+    def test_client(self, base_url="http://testserver"):
+        """
+        Creates an in-process test client, it calls the app directly
+        without going through an HTTP client (see `osa.testing`).
+        """
+        from .testing import TestClient
+        return TestClient(self, base_url=base_url)
+
     def test_session(self, base_url="http://testserver"):
         """
-        Creates a test client to test the application.
+        Creates a requests.Session mounted on the application.
+        Needs the optional `requests` and `requests-wsgi-adapter` packages,
+        `test_client` is faster and has no dependencies.
         """
+        from requests import Session as RequestsSession
+        from wsgiadapter import WSGIAdapter as RequestsWSGIAdapter
         session = RequestsSession()
         session.mount(prefix=base_url, adapter=RequestsWSGIAdapter(self))
         return session
 
-    def is_static_file(self):
-        return request.path.startswith(self._static_root)
+    def mount(self, prefix, app):
+        """
+        Serve every request under `prefix` with `app`, another Osa app (with its own routes,
+        hooks and error handlers) or any WSGI application. See `osa.mounts`.
+        """
+        self.mounts.insert(prefix, app)
 
-    def cut_static_root(self):
-        return request.path[len(self._static_root):]
-         # /static/css/style.css -> /css/style.css
+    def dispatch_mount(self, prefix, app):
+        """
+        Call the app mounted on `prefix`, returns its response.
+        """
+        environ = mount_environ(request.environ, prefix)
+        response = Request(environ).get_response(app)
+        route = environ.get("osa.route")
+        request.environ["osa.route"] = prefix + route if route else prefix
+        return response
+
+    def serve_static(self, environ, start_response):
+        """
+        The static files mount, /static/css/style.css -> static_dir/css/style.css.
+        Errors (404, 403) go to the error handlers of this app.
+        """
+        response = self.static_handler.serve(environ["PATH_INFO"], Request(environ))
+        return response(environ, start_response)
 
 
 
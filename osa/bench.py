@@ -0,0 +1,204 @@
+"""
+A small load generator behind `osa bench`, to compare builds before deploying.
+
+It drives an app with a mix of URLs from several threads for a fixed duration and
+reports, for every route (in-process) or every URL of the mix (loopback):
+   - the number of requests and errors (5xx responses, exceptions, connection errors)
+   - requests per second
+   - p50 / p90 / p99 / max latency
+
+Two modes:
+   - in-process: the WSGI callable is called directly, measuring the framework and
+     the app without any network or server in between. Requests are grouped by the route
+     that served them ("GET /items/{item_id}"), or by path when no route matched.
+   - loopback: requests are sent with http.client to a running server (e.g. `osa run`),
+     one keep-alive connection per thread. The route is not known outside the server,
+     requests are grouped by URL ("GET /items/1" and "GET /items/2" are two rows).
+
+A URL of the mix is written as "[METHOD] PATH [WEIGHT]", e.g. "/", "POST /items" or "GET /search?q=a 5".
+"""
+
+import http.client
+import json
+import math
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+from .constants import HTTPMethod
+from .testing import build_environ
+
+
+def parse_url_spec(spec):
+    """
+    Parse "[METHOD] PATH [WEIGHT]" into (method, path, weight).
+    """
+    tokens = spec.split()
+    if not tokens:
+        raise ValueError("Empty URL in the mix.")
+    method = "GET"
+    weight = 1
+    if tokens[0].upper() in HTTPMethod:
+        method = tokens.pop(0).upper()
+    if len(tokens) == 2 and tokens[1].isdigit():
+        weight = int(tokens.pop())
+    if len(tokens) != 1 or not tokens[0].startswith("/"):
+        raise ValueError(f"Invalid URL {spec!r}, expected '[METHOD] /path [WEIGHT]'.")
+    return method, tokens[0], weight
+
+
+def wsgi_sender(app):
+    """
+    Returns a factory of `send(method, path) -> (status code, route)` calling the app directly.
+    """
+    def factory():
+        def send(method, path):
+            status = []
+
+            def start_response(status_line, headers, exc_info=None):
+                status.append(status_line)
+
+            environ = build_environ(method, path)
+            result = app(environ, start_response)
+            try:
+                for _ in result:
+                    pass
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+            return int(status[0].split(" ", 1)[0]), environ.get("osa.route") or path
+        return send
+    return factory
+
+
+def http_sender(target, timeout=30):
+    """
+    Returns a factory of `send(method, path) -> (status code, path)` using one connection per thread.
+    """
+    parts = urlsplit(target)
+    if parts.scheme not in ("http", ""):
+        raise ValueError("Only http:// targets are supported.")
+    host = parts.hostname or "127.0.0.1"
+    port = parts.port or 80
+    prefix = parts.path.rstrip("/")
+
+    def factory():
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+
+        def send(method, path):
+            try:
+                conn.request(method, prefix + path)
+                res = conn.getresponse()
+                res.read()
+                return res.status, path
+            except (OSError, http.client.HTTPException):
+                conn.close()  # reconnect on the next request
+                raise
+        return send
+    return factory
+
+
+class RouteStats:
+    __slots__ = ("latencies", "errors")
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+
+def run(sender_factory, mix, concurrency=1, duration=10.0, seed=0):
+    """
+    Send requests from `concurrency` threads for `duration` seconds.
+    Returns (stats by "METHOD route", elapsed seconds), the route being the one `send` returns.
+    """
+    entries = [(method, path) for method, path, _ in mix]
+    weights = [weight for _, _, weight in mix]
+    per_thread = [dict() for _ in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker(index):
+        send = sender_factory()
+        stats = per_thread[index]
+        rng = random.Random(seed + index)
+        clock = time.perf_counter
+        barrier.wait()
+        while clock() < deadline[0]:
+            method, path = rng.choices(entries, weights)[0]
+            start = clock()
+            try:
+                status, name = send(method, path)
+            except Exception:
+                status, name = None, path
+            latency = clock() - start
+            route = stats.get((method, name))
+            if route is None:
+                route = stats[(method, name)] = RouteStats()
+            route.latencies.append(latency)
+            if status is None or status >= 500:
+                route.errors += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    deadline[0] = start + duration
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    merged = {}
+    for stats in per_thread:
+        for (method, name), route in stats.items():
+            total = merged.setdefault(f"{method} {name}", RouteStats())
+            total.latencies.extend(route.latencies)
+            total.errors += route.errors
+    return merged, elapsed
+
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def summarize(stats, elapsed):
+    """
+    Turn raw latencies into a JSON friendly report (latencies in milliseconds).
+    """
+    def describe(latencies, errors):
+        latencies = sorted(latencies)
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "max_ms": round((latencies[-1] if latencies else 0.0) * 1000, 3),
+        }
+
+    routes = {name: describe(route.latencies, route.errors) for name, route in sorted(stats.items())}
+    all_latencies = [value for route in stats.values() for value in route.latencies]
+    total = describe(all_latencies, sum(route.errors for route in stats.values()))
+    return {"duration_s": round(elapsed, 3), "routes": routes, "total": total}
+
+
+def format_report(summary):
+    columns = ("requests", "errors", "rps", "p50_ms", "p90_ms", "p99_ms", "max_ms")
+    rows = list(summary["routes"].items()) + [("TOTAL", summary["total"])]
+    width = max(len(name) for name, _ in rows)
+    lines = [f"{'route':<{width}}  " + "  ".join(f"{column:>10}" for column in columns)]
+    for name, values in rows:
+        lines.append(f"{name:<{width}}  " + "  ".join(f"{values[column]:>10}" for column in columns))
+    lines.append(f"duration: {summary['duration_s']}s")
+    return "\n".join(lines)
+
+
+def to_json(summary):
+    return json.dumps(summary, indent=2)
@@ -0,0 +1,227 @@
+"""
+Cache backends for Osa.
+
+Both backends have the same small API, so the caching features of the framework
+(static responses, server-side sessions...) can use either one:
+
+    cache.get(key, default=None)
+    cache.set(key, value, ttl=None)  -> False if the value does not fit
+    cache.delete(key)                -> True if the key was there
+    cache.clear()
+
+1. MemoryCache:
+   - A dict in the current process, LRU with max_entries and a TTL per entry.
+   - With the pre-fork server every worker has its own copy, cold after each restart.
+
+2. SharedMemoryCache:
+   - One fixed-size hash table in an anonymous shared mmap. Create it before the workers
+     are forked (e.g. when the app module is imported) and all of them share the same
+     warm entries, without an external cache service.
+   - The table has `slots` slots of `slot_size` bytes. A key goes to one set of `ways`
+     consecutive slots (a set-associative table): a lookup reads at most `ways` slots.
+   - When the set is full, the least recently used slot of the set is evicted (LRU-ish:
+     the LRU is per set, not global).
+   - Values are pickled, an entry (key + pickled value + 32 bytes) larger than a slot is
+     not cached.
+   - A multiprocessing lock, inherited by the workers, guards the table.
+
+Read more here:
+    https://docs.python.org/3/library/mmap.html
+    https://en.wikipedia.org/wiki/CPU_cache#Associativity
+"""
+
+import mmap
+import multiprocessing
+import pickle
+import struct
+import threading
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+
+
+class MemoryCache:
+    def __init__(self, max_entries=1024, default_ttl=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()  # key -> (expires, value), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] is not None and entry[0] < time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# magic, slots, slot size, ways, hits, misses, evictions
+_HEADER = struct.Struct("<4sIIIQQQ")
+# key hash (0 = empty slot), expires (0 = never), last access, key length, value length
+_ENTRY = struct.Struct("<QddII")
+_MAGIC = b"OSAC"
+
+
+def _hash(key):
+    # hash() is randomized per interpreter, the slot of a key must be the same in every process
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryCache:
+    def __init__(self, slots=1024, slot_size=4096, ways=8, default_ttl=None):
+        if slot_size <= _ENTRY.size:
+            raise ValueError(f"slot_size must be larger than {_ENTRY.size} bytes.")
+        self.ways = max(1, min(ways, slots))
+        self.sets = max(1, slots // self.ways)
+        self.slots = self.sets * self.ways
+        self.slot_size = slot_size
+        self.default_ttl = default_ttl
+        # An anonymous mmap is MAP_SHARED: forked workers see the same memory
+        self._map = mmap.mmap(-1, _HEADER.size + self.slots * slot_size)
+        _HEADER.pack_into(self._map, 0, _MAGIC, self.slots, slot_size, self.ways, 0, 0, 0)
+        self._lock = multiprocessing.Lock()
+
+    @property
+    def max_value_size(self):
+        return self.slot_size - _ENTRY.size
+
+    def _offset(self, index):
+        return _HEADER.size + index * self.slot_size
+
+    def _find(self, key_hash, key):
+        """
+        Offset of the slot that holds `key`, or None.
+        """
+        first = (key_hash % self.sets) * self.ways
+        for index in range(first, first + self.ways):
+            offset = self._offset(index)
+            entry_hash, _, _, key_len, _ = _ENTRY.unpack_from(self._map, offset)
+            if entry_hash == key_hash:
+                start = offset + _ENTRY.size
+                if self._map[start:start + key_len] == key:
+                    return offset
+        return None
+
+    def _count(self, field):
+        # field: 4 hits, 5 misses, 6 evictions
+        values = list(_HEADER.unpack_from(self._map, 0))
+        values[field] += 1
+        _HEADER.pack_into(self._map, 0, *values)
+
+    def get(self, key, default=None):
+        key = key.encode() if isinstance(key, str) else key
+        key_hash = _hash(key)
+        now = time.time()
+        with self._lock:
+            offset = self._find(key_hash, key)
+            if offset is None:
+                self._count(5)
+                return default
+            _, expires, _, key_len, value_len = _ENTRY.unpack_from(self._map, offset)
+            if expires and expires < now:
+                _ENTRY.pack_into(self._map, offset, 0, 0.0, 0.0, 0, 0)
+                self._count(5)
+                return default
+            _ENTRY.pack_into(self._map, offset, key_hash, expires, now, key_len, value_len)
+            start = offset + _ENTRY.size + key_len
+            data = self._map[start:start + value_len]
+            self._count(4)
+        return pickle.loads(data)
+
+    def set(self, key, value, ttl=None):
+        """
+        Store `value` for `ttl` seconds, returns False if the entry is larger than a slot.
+        The previous value of the key is removed in that case, it would be stale.
+        """
+        key = key.encode() if isinstance(key, str) else key
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(key) + len(data) > self.max_value_size:
+            self.delete(key)
+            return False
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        expires = now + ttl if ttl is not None else 0.0
+        key_hash = _hash(key)
+        with self._lock:
+            offset = self._find(key_hash, key)
+            if offset is None:
+                offset = self._free_slot(key_hash, now)
+            _ENTRY.pack_into(self._map, offset, key_hash, expires, now, len(key), len(data))
+            start = offset + _ENTRY.size
+            self._map[start:start + len(key)] = key
+            self._map[start + len(key):start + len(key) + len(data)] = data
+        return True
+
+    def _free_slot(self, key_hash, now):
+        """
+        An empty or expired slot of the set of `key_hash`, or its least recently used one.
+        """
+        first = (key_hash % self.sets) * self.ways
+        victim, oldest = None, None
+        for index in range(first, first + self.ways):
+            offset = self._offset(index)
+            entry_hash, expires, last_access, _, _ = _ENTRY.unpack_from(self._map, offset)
+            if entry_hash == 0 or (expires and expires < now):
+                return offset
+            if oldest is None or last_access < oldest:
+                victim, oldest = offset, last_access
+        self._count(6)
+        return victim
+
+    def delete(self, key):
+        key = key.encode() if isinstance(key, str) else key
+        with self._lock:
+            offset = self._find(_hash(key), key)
+            if offset is None:
+                return False
+            _ENTRY.pack_into(self._map, offset, 0, 0.0, 0.0, 0, 0)
+            return True
+
+    def clear(self):
+        with self._lock:
+            for index in range(self.slots):
+                _ENTRY.pack_into(self._map, self._offset(index), 0, 0.0, 0.0, 0, 0)
+
+    def __len__(self):
+        now = time.time()
+        count = 0
+        with self._lock:
+            for index in range(self.slots):
+                entry_hash, expires, _, _, _ = _ENTRY.unpack_from(self._map, self._offset(index))
+                if entry_hash and not (expires and expires < now):
+                    count += 1
+        return count
+
+    def stats(self):
+        with self._lock:
+            _, slots, slot_size, ways, hits, misses, evictions = _HEADER.unpack_from(self._map, 0)
+        return {"slots": slots, "slot_size": slot_size, "ways": ways,
+                "hits": hits, "misses": misses, "evictions": evictions}
+
+    def close(self):
+        self._map.close()
@@ -2,8 +2,8 @@
 
 import os
 import click
-from wsgiref.simple_server import make_server
 import importlib
+import importlib.util
 import sys
 
 class NoAppException(click.UsageError):
@@ -127,8 +127,13 @@ def cli():
 @click.option('--port', default=8300, help='Port to run the server on.')
 @click.option('--app' ,help='The WSGI application to run,e.g,->filename:application_name.', required=False)
 @click.option('--no-debug', is_flag=True, help='Disable debug mode.')
-def run(host, port,app=None, no_debug=False):
+@click.option('--workers', default=1, type=click.IntRange(min=1), help='Number of worker processes (pre-fork mode).')
+@click.option('--threads', default=None, type=click.IntRange(min=1), help='Number of threads per worker (default: 1 for wsgiref, 8 for selectors).')
+@click.option('--reuse-port', is_flag=True, help='Give each worker its own socket with SO_REUSEPORT.')
+@click.option('--engine', default='wsgiref', type=click.Choice(['wsgiref', 'selectors']), help='Server engine, "selectors" keeps HTTP/1.1 connections alive.')
+def run(host, port,app=None, no_debug=False, workers=1, threads=None, reuse_port=False, engine='wsgiref'):
     """Run the web server."""
+    app_argument = app
     app = find_app_module(app)
     
     if app is None :
@@ -137,6 +142,20 @@ def run(host, port,app=None, no_debug=False):
         raise NoAppException("The app is not a valid WSGI application.")
     if no_debug:
         app.debug = False
+    if workers > 1 or threads or reuse_port or engine != 'wsgiref':
+        from .server import serve
+
+        def load_app():
+            # Used on SIGHUP to re-import the application code
+            new_app = find_app_module(app_argument)
+            if no_debug:
+                new_app.debug = False
+            return new_app
+
+        click.secho(f" * Running on http://{host}:{port}/ with the {engine} engine and {workers} worker(s) (Press CTRL+C to quit)",fg='green')
+        serve(app, host, port, workers=workers, threads=threads, reuse_port=reuse_port, app_loader=load_app, engine=engine)
+        return
+    from wsgiref.simple_server import make_server
     click.secho(f"WARNING: This is a simple development server. Do not use it in a production deployment.",fg='red')
     click.secho(f"Use a production WSGI server instead.")
 
@@ -144,8 +163,37 @@ def run(host, port,app=None, no_debug=False):
         click.secho(f" * Running on http://{host}:{port}/ (Press CTRL+C to quit)",fg='green')
         httpd.serve_forever()
 
-# Add the run command to the CLI group
+@click.command()
+@click.option('--app' ,help='The WSGI application to benchmark in-process,e.g,->filename:application_name.', required=False)
+@click.option('--target', help='Benchmark a running server instead, e.g. http://127.0.0.1:8300.', required=False)
+@click.option('--url', 'urls', multiple=True, default=['/'], show_default=True, help='URL of the mix as "[METHOD] PATH [WEIGHT]", repeat for several URLs.')
+@click.option('--concurrency', '-c', default=1, type=click.IntRange(min=1), help='Number of concurrent clients.')
+@click.option('--duration', '-d', default=10.0, type=click.FloatRange(min=0, min_open=True), help='Duration of the benchmark in seconds.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON.')
+def bench(app=None, target=None, urls=('/',), concurrency=1, duration=10.0, as_json=False):
+    """Benchmark the app and report latency percentiles per route (per URL with --target)."""
+    from . import bench as osa_bench
+
+    try:
+        mix = [osa_bench.parse_url_spec(spec) for spec in urls]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="'--url'")
+    if target:
+        sender = osa_bench.http_sender(target)
+    else:
+        app = find_app_module(app)
+        if not callable(app):
+            raise NoAppException("The app is not a valid WSGI application.")
+        sender = osa_bench.wsgi_sender(app)
+    if not as_json:
+        click.secho(f" * Benchmarking {target or 'in-process'} for {duration}s with {concurrency} client(s)", fg='green')
+    stats, elapsed = osa_bench.run(sender, mix, concurrency=concurrency, duration=duration)
+    summary = osa_bench.summarize(stats, elapsed)
+    click.echo(osa_bench.to_json(summary) if as_json else osa_bench.format_report(summary))
+
+# Add the commands to the CLI group
 cli.add_command(run)
+cli.add_command(bench)
 def main():
     cli()
 
@@ -1,27 +1,79 @@
+import threading
 from webob import Request, Response
 from .globals import _request_ctx_var, _response_ctx_var
 
+# Contexts are recycled instead of being allocated for every request:
+# - every thread keeps a small free list of contexts, no lock is needed to take one.
+# - push() keeps the token of ContextVar.set and pop() resets to it, so a nested request
+#   (e.g. the test client called from a view) restores the outer request when it ends.
+# - the webob Request and Response are still created per request: the response is returned
+#   to the server and its body is sent after the context is released (a body generator may
+#   still use the request), and static responses are cached. They are never recycled.
+
+POOL_SIZE = 8
+
+
+class FreeList(threading.local):
+    """
+    Recycled objects of the current thread.
+    """
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self.items = []
+
+
 class RequestContext:
     """
     The request context contains per-request information. The Osa
-    app creates and pushes it at the beginning of the request,
-    then pops it at the end of the request.
-    It will create the request object for the WSGI environment provided.
+    app takes it from the pool (`acquire`) and pushes it at the beginning of the request,
+    then pops and releases it at the end of the request.
+    It holds the request object for the WSGI environment provided.
     """
+    __slots__ = ("request", "_token")
+    _free = FreeList()
+
     def __init__(self, environ):
         self.request = Request(environ)
+        self._token = None
+
+    @classmethod
+    def acquire(cls, environ):
+        """
+        A context for `environ`, recycled from the free list of this thread when possible.
+        """
+        items = cls._free.items
+        if items:
+            ctx = items.pop()
+            ctx.request = Request(environ)
+            return ctx
+        return cls(environ)
+
+    def release(self):
+        """
+        Give the context back to the free list, it must not be used afterwards.
+        """
+        # Only drop the reference, the body of the response may still use the request
+        self.request = None
+        free = self._free
+        if len(free.items) < free.size:
+            free.items.append(self)
 
     def push(self):
         """
         Push the request context to the context variable stack.
         """
-        return _request_ctx_var.set(self.request)
+        self._token = _request_ctx_var.set(self.request)
+        return self._token
 
     def pop(self):
         """
         Pop the current request context from the stack.
         """
-        _request_ctx_var.set(None)
+        if self._token is None:
+            _request_ctx_var.set(None)
+        else:
+            _request_ctx_var.reset(self._token)
+            self._token = None
 
     @property
     def current(self):
@@ -34,22 +86,49 @@ class RequestContext:
 
 class ResponseContext:
     """
-    Response context to handle per-request data like response. 
+    Response context to handle per-request data like response.
     """
+    __slots__ = ("response", "_token")
+    _free = FreeList()
+
     def __init__(self):
         self.response = Response()
+        self._token = None
+
+    @classmethod
+    def acquire(cls):
+        """
+        A context with a new response, recycled from the free list of this thread when possible.
+        """
+        items = cls._free.items
+        if items:
+            ctx = items.pop()
+            ctx.response = Response()
+            return ctx
+        return cls()
+
+    def release(self):
+        self.response = None
+        free = self._free
+        if len(free.items) < free.size:
+            free.items.append(self)
 
     def push(self):
         """
         Push the response context to the context variable stack.
         """
-        return _response_ctx_var.set(self.response)
+        self._token = _response_ctx_var.set(self.response)
+        return self._token
 
     def pop(self):
         """
         Pop the current response context from the stack.
         """
-        _response_ctx_var.set(None)
+        if self._token is None:
+            _response_ctx_var.set(None)
+        else:
+            _response_ctx_var.reset(self._token)
+            self._token = None
 
     @property
     def current(self):
@@ -57,4 +136,3 @@ class ResponseContext:
         Get the current response context.
         """
         return _response_ctx_var.get()
-
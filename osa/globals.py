@@ -6,6 +6,10 @@ from .local_proxy import LocalProxy
 _app_ctx_var = contextvars.ContextVar('app', default=None)
 _request_ctx_var = contextvars.ContextVar('request', default=None)
 _response_ctx_var = contextvars.ContextVar('response', default=None)
+# Phase timings of the current request, only set when `osa.metrics` is enabled
+_timings_ctx_var = contextvars.ContextVar('timings', default=None)
+# SessionSlot of the current request, only set when a session store is attached to the app
+_session_ctx_var = contextvars.ContextVar('session', default=None)
 
 current_app = LocalProxy(_app_ctx_var)
 _no_req_msg = """\
@@ -24,3 +28,37 @@ an active HTTP response.
 
 response = LocalProxy(_response_ctx_var,_no_res_msg )
 
+_no_session_msg = """\
+Working outside of request context, or no session store is configured.
+Attach one to the app first, e.g. SignedCookieSessionStore(app, secret_key=...).
+"""
+
+
+class SessionProxy(LocalProxy):
+    """
+    Loads the session of the current request the first time it is used.
+    """
+    def _get_current_object(self):
+        return super()._get_current_object().get()
+
+    def __getitem__(self, key):
+        return self._get_current_object()[key]
+
+    def __setitem__(self, key, value):
+        self._get_current_object()[key] = value
+
+    def __delitem__(self, key):
+        del self._get_current_object()[key]
+
+    def __contains__(self, key):
+        return key in self._get_current_object()
+
+    def __iter__(self):
+        return iter(self._get_current_object())
+
+    def __len__(self):
+        return len(self._get_current_object())
+
+
+session = SessionProxy(_session_ctx_var, _no_session_msg)
+
@@ -0,0 +1,216 @@
+"""
+Memory accounting for Osa: which routes allocate the most, and what keeps growing?
+
+    from osa.memory import MemoryProfiler
+
+    MemoryProfiler(app, token="change-me")
+
+1. Per request:
+   - tracemalloc traces every allocation of the process while the profiler is on.
+   - For every request the app records the net allocation (memory still allocated when the
+     response is ready, a leak or a cache filling up) and the peak above the start of the
+     request (the temporary memory the handler needed).
+   - Both are aggregated by route: requests, total and average net, maximum peak.
+   - tracemalloc only has process-wide counters: with several threads the numbers of a
+     request also contain the allocations of the requests running at the same time.
+     For exact numbers run one thread per worker during the load test.
+
+2. Admin endpoint (GET admin_path, the token goes in X-Osa-Memory-Token or ?token=):
+   - ?action=report: the top routes and the top code sites (file:line) by allocated memory.
+   - ?action=snapshot: take a snapshot now, returns its id.
+   - ?action=diff&from=<id>[&to=<id>]: what was allocated between two snapshots (or since a
+     snapshot, when `to` is omitted), by code site. Taking a snapshot before and after a load
+     test shows the leaks.
+
+tracemalloc makes allocations noticeably slower (often 2x or more): use it in load tests
+and for short periods in production, not permanently.
+
+The peak of a request needs tracemalloc.reset_peak(), added in Python 3.9. On older
+versions only the net allocation is recorded and the max peak column stays at 0.
+
+Read more here:
+    https://docs.python.org/3/library/tracemalloc.html
+"""
+
+import hmac
+import threading
+import time
+import tracemalloc
+from .exceptions import abort
+from .globals import request, response
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+# Python 3.9+, without it the peak of a single request cannot be measured
+_reset_peak = getattr(tracemalloc, "reset_peak", None)
+
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+class RouteMemory:
+    __slots__ = ("requests", "net", "max_net", "max_peak")
+
+    def __init__(self):
+        self.requests = 0
+        self.net = 0
+        self.max_net = 0
+        self.max_peak = 0
+
+
+class MemoryProfiler:
+    def __init__(self, app=None, token=None, admin_path="/_osa/memory", frames=1, top=20, max_snapshots=10):
+        self.token = token
+        self.admin_path = admin_path
+        self.frames = frames
+        self.top = top
+        self.max_snapshots = max_snapshots
+        self.routes = {}      # route -> RouteMemory
+        self.snapshots = {}   # id -> (time, Snapshot)
+        self._next_id = 1
+        self._started = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Start tracing, account the requests of the app and register the admin endpoint
+        (when a token is given).
+        """
+        app.memory = self
+        self.start()
+        if self.admin_path and self.token:
+            app.router.add_route(self.admin_path, self.admin_view, ["GET", "POST"])
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started = True
+
+    def stop(self):
+        """
+        Stop tracing, if this profiler started it.
+        """
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    # Called by the app for every request
+
+    def enter(self):
+        current, _ = tracemalloc.get_traced_memory()
+        if _reset_peak is not None:
+            _reset_peak()
+        return current
+
+    def leave(self, environ, start):
+        current, peak = tracemalloc.get_traced_memory()
+        net = current - start
+        route = environ.get("osa.route") or "<unmatched>"
+        with self._lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteMemory()
+            stats.requests += 1
+            stats.net += net
+            stats.max_net = max(stats.max_net, net)
+            if _reset_peak is not None:
+                stats.max_peak = max(stats.max_peak, peak - start)
+
+    # Reports
+
+    def top_routes(self, limit=None):
+        """
+        [(route, RouteMemory)] sorted by total net allocation.
+        """
+        with self._lock:
+            items = list(self.routes.items())
+        items.sort(key=lambda item: item[1].net, reverse=True)
+        return items[:limit or self.top]
+
+    def take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+    def top_sites(self, limit=None):
+        return self.take_snapshot().statistics("lineno")[:limit or self.top]
+
+    def snapshot(self):
+        """
+        Take and keep a snapshot, returns its id.
+        """
+        snapshot = self.take_snapshot()
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self.snapshots[snapshot_id] = (time.time(), snapshot)
+            while len(self.snapshots) > self.max_snapshots:
+                del self.snapshots[min(self.snapshots)]
+        return snapshot_id
+
+    def diff(self, first, second=None, limit=None):
+        """
+        What changed between two snapshots (or since `first`), by code site.
+        """
+        old = self.snapshots[first][1]
+        new = self.snapshots[second][1] if second is not None else self.take_snapshot()
+        return new.compare_to(old, "lineno")[:limit or self.top]
+
+    def report(self):
+        current, _ = tracemalloc.get_traced_memory()
+        lines = [f"traced memory: {format_size(current)}", "", "top routes by net allocation:"]
+        lines.append(f"{'route':<40} {'requests':>9} {'avg net':>11} {'max net':>11} {'max peak':>11}")
+        for route, stats in self.top_routes():
+            lines.append(
+                f"{route:<40} {stats.requests:>9} {format_size(stats.net / stats.requests):>11} "
+                f"{format_size(stats.max_net):>11} {format_size(stats.max_peak):>11}"
+            )
+        lines += ["", "top code sites:"]
+        for stat in self.top_sites():
+            frame = stat.traceback[0]
+            lines.append(f"{format_size(stat.size):>11} {stat.count:>8} blocks  {frame.filename}:{frame.lineno}")
+        return "\n".join(lines) + "\n"
+
+    def format_diff(self, stats):
+        lines = []
+        for stat in stats:
+            frame = stat.traceback[0]
+            lines.append(
+                f"{format_size(stat.size_diff):>11} {stat.count_diff:>+8} blocks  "
+                f"(now {format_size(stat.size)})  {frame.filename}:{frame.lineno}"
+            )
+        return "\n".join(lines) + "\n"
+
+    # Admin endpoint
+
+    def admin_view(self):
+        """
+        ?action=report|snapshot|diff, the token goes in X-Osa-Memory-Token or ?token=.
+        """
+        token = request.headers.get("X-Osa-Memory-Token") or request.GET.get("token")
+        if token is None or not hmac.compare_digest(token.encode(), self.token.encode()):
+            abort(403)
+        response.content_type = "text/plain"
+        action = request.params.get("action", "report")
+        if action == "report":
+            response.text = self.report()
+        elif action == "snapshot":
+            response.text = f"{self.snapshot()}\n"
+        elif action == "diff":
+            try:
+                first = int(request.params["from"])
+                second = int(request.params["to"]) if "to" in request.params else None
+                stats = self.diff(first, second)
+            except (KeyError, ValueError):
+                abort(400)
+            response.text = self.format_diff(stats)
+        else:
+            abort(400)
@@ -0,0 +1,182 @@
+"""
+Request instrumentation for Osa: where does the time of a request go?
+
+1. Phase timing:
+   - Every request records how long each phase took: before_request hooks, routing,
+     the handler, template rendering and after_request hooks.
+   - Templates are rendered inside another phase (usually the handler). Their time is only
+     reported in `template` and taken out of that phase, so the phases add up to the
+     request time instead of counting templates twice.
+   - With server_timing=True the phases are sent back in a `Server-Timing` header,
+     so they show up in the browser dev tools next to the request.
+
+2. Metrics:
+   - A request counter per route, method and status, an error counter (5xx),
+     a latency histogram per route and the total time spent in every phase.
+   - They are exposed in the Prometheus text format on an opt-in route (/metrics by default).
+   - Values are per process, with the pre-fork server every worker reports its own.
+
+Nothing is measured until a Metrics object is attached to the app, the request path
+only checks `app.metrics is None`.
+
+Read more here:
+    https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Server-Timing
+    https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from .globals import response
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "<unmatched>"  # one label for every 404, instead of one per URL
+
+
+class PhaseTimings:
+    """
+    Durations of the phases of the current request, in seconds.
+    """
+    __slots__ = ("phases", "_nested")
+
+    def __init__(self):
+        self.phases = {}
+        self._nested = 0.0  # time of the nested phases since the last top-level one
+
+    def add(self, name, start, nested=False):
+        """
+        Record the time since `start` for the phase `name`, returns the current time
+        so the next phase can start from it.
+        A nested phase (e.g. template) runs inside the next top-level phase recorded,
+        its time is subtracted from that one.
+        """
+        now = perf_counter()
+        duration = now - start
+        if nested:
+            self._nested += duration
+        else:
+            duration -= self._nested
+            self._nested = 0.0
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+        return now
+
+    def header(self, total=None):
+        """
+        Format the phases as a Server-Timing header value (durations in milliseconds).
+        """
+        items = [f"{name};dur={duration * 1000:.3f}" for name, duration in self.phases.items()]
+        if total is not None:
+            items.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(items)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    def __init__(self, app=None, path="/metrics", server_timing=False, buckets=DEFAULT_BUCKETS):
+        self.path = path
+        self.server_timing = server_timing
+        self.buckets = tuple(sorted(buckets))
+        self.requests = {}   # (route, method, status) -> count
+        self.errors = {}     # route -> count
+        self.latency = {}    # (route, method) -> Histogram
+        self.phases = {}     # (route, phase) -> [sum, count]
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Enable instrumentation for the given app and register the metrics route.
+        """
+        app.metrics = self
+        if self.path:
+            app.router.add_route(self.path, self.view, ["GET"])
+
+    def observe(self, route, method, status, duration, timings=None):
+        """
+        Record a finished request.
+        """
+        route = route or UNMATCHED_ROUTE
+        bucket = bisect_left(self.buckets, duration)
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if status >= 500:
+                self.errors[route] = self.errors.get(route, 0) + 1
+            histogram = self.latency.get((route, method))
+            if histogram is None:
+                histogram = self.latency[(route, method)] = Histogram(len(self.buckets) + 1)
+            histogram.counts[bucket] += 1
+            histogram.sum += duration
+            histogram.count += 1
+            if timings is not None:
+                for phase, seconds in timings.phases.items():
+                    total = self.phases.get((route, phase))
+                    if total is None:
+                        total = self.phases[(route, phase)] = [0.0, 0]
+                    total[0] += seconds
+                    total[1] += 1
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            requests = sorted(self.requests.items())
+            errors = sorted(self.errors.items())
+            latency = sorted((key, list(h.counts), h.sum, h.count) for key, h in self.latency.items())
+            phases = sorted((key, list(total)) for key, total in self.phases.items())
+
+        lines = [
+            "# HELP osa_requests_total Total number of HTTP requests.",
+            "# TYPE osa_requests_total counter",
+        ]
+        for (route, method, status), count in requests:
+            lines.append(f"osa_requests_total{_labels(route=route, method=method, status=status)} {count}")
+        lines += [
+            "# HELP osa_request_errors_total Total number of requests answered with a 5xx status.",
+            "# TYPE osa_request_errors_total counter",
+        ]
+        for route, count in errors:
+            lines.append(f"osa_request_errors_total{_labels(route=route)} {count}")
+        lines += [
+            "# HELP osa_request_duration_seconds Time spent handling a request.",
+            "# TYPE osa_request_duration_seconds histogram",
+        ]
+        for (route, method), counts, total, count in latency:
+            cumulative = 0
+            for le, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"osa_request_duration_seconds_bucket{_labels(route=route, method=method, le=le)} {cumulative}"
+                )
+            lines.append(f"osa_request_duration_seconds_sum{_labels(route=route, method=method)} {total}")
+            lines.append(f"osa_request_duration_seconds_count{_labels(route=route, method=method)} {count}")
+        lines += [
+            "# HELP osa_request_phase_seconds Time spent in each phase of a request.",
+            "# TYPE osa_request_phase_seconds summary",
+        ]
+        for (route, phase), (total, count) in phases:
+            lines.append(f"osa_request_phase_seconds_sum{_labels(route=route, phase=phase)} {total}")
+            lines.append(f"osa_request_phase_seconds_count{_labels(route=route, phase=phase)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def view(self):
+        response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+        response.text = self.render()
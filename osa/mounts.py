@@ -0,0 +1,99 @@
+"""
+Prefix dispatch for mounted applications.
+
+    app.mount("/api", api_app)          # another Osa app
+    app.mount("/legacy", flask_app)     # or any WSGI application
+    app.mount("/media", StaticFileHandler("media"))
+
+1. Lookup:
+   - Mount points are kept in a trie of path segments: /api/v1 is the node "v1" under "api".
+   - A request walks the trie once with the segments of its path and takes the deepest
+     mount point on the way (the longest prefix), whatever the number of mounts.
+   - Prefixes match whole segments only: /api matches /api and /api/users, not /apidocs.
+
+2. Dispatch (PEP 3333):
+   - The mounted app gets a copy of the environ with the prefix moved from PATH_INFO to
+     SCRIPT_NAME, so its routes do not include the prefix: /api/users is /users for api_app.
+   - A mounted Osa app runs with its own router, before/after_request hooks and error
+     handlers. The hooks of the parent app do not run for it.
+
+Static files are served by a mount too (/static by default).
+
+Read more here:
+    https://peps.python.org/pep-3333/#environ-variables
+"""
+
+
+def split_path(path):
+    return [segment for segment in path.split("/") if segment]
+
+
+class PrefixTrie:
+    """
+    Maps path prefixes to values, lookup returns the value of the longest matching prefix.
+    """
+    __slots__ = ("root", "size")
+
+    def __init__(self):
+        # Every node is a dict of segment -> child node, the key None holds (prefix, value)
+        self.root = {}
+        self.size = 0
+
+    def insert(self, prefix, value):
+        segments = split_path(prefix)
+        if not segments:
+            raise ValueError("Cannot mount on '/', use the routes of the app itself.")
+        node = self.root
+        for segment in segments:
+            node = node.setdefault(segment, {})
+        if None not in node:
+            self.size += 1
+        node[None] = ("/" + "/".join(segments), value)
+
+    def remove(self, prefix):
+        """
+        Remove the value of `prefix`, returns True if it was there.
+        """
+        node = self.root
+        for segment in split_path(prefix):
+            node = node.get(segment)
+            if node is None:
+                return False
+        if node.pop(None, None) is None:
+            return False
+        self.size -= 1
+        return True
+
+    def lookup(self, path):
+        """
+        (prefix, value) of the longest prefix of `path`, or None.
+        """
+        node = self.root
+        found = None
+        for segment in path.split("/"):
+            if not segment:
+                continue
+            node = node.get(segment)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
+
+    def __len__(self):
+        return self.size
+
+
+def mount_environ(environ, prefix):
+    """
+    A copy of `environ` for the app mounted on `prefix`.
+    """
+    environ = dict(environ)
+    path_info = environ.get("PATH_INFO", "")
+    # Keep the path exactly as sent (e.g. double slashes) after the prefix
+    position = 0
+    for segment in split_path(prefix):
+        position = path_info.index(segment, position) + len(segment)
+    environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + path_info[:position]
+    environ["PATH_INFO"] = path_info[position:]
+    environ.pop("osa.route", None)
+    return environ
@@ -0,0 +1,267 @@
+"""
+Profiling an Osa app in production, without redeploying.
+
+1. RequestProfiler (on demand, one request):
+   - A request that carries the secret token, in the X-Osa-Profile header or in the
+     __profile query parameter, runs under cProfile.
+   - The response is replaced by the pstats report of that request, or, with output_dir,
+     the stats are written to a .prof file (for snakeviz, pstats...) and the normal response
+     is returned with an X-Osa-Profile-File header.
+
+2. SamplingProfiler (continuous, low overhead):
+   - A background thread wakes up every `interval` seconds and captures the stack of every
+     thread that is serving a request, tagged with the route of that request.
+   - Nothing is traced, the cost is one stack walk per in-flight request per sample.
+   - Samples are written as collapsed stacks ("route;frame;frame count" per line), the input of
+     flamegraph.pl, speedscope or inferno.
+   - Start/stop it with the admin endpoint (guarded by a token) or by sending a signal
+     (SIGUSR2 by default) to the process: `kill -USR2 <pid>`. The signal handler only sets
+     an event, a control thread does the start/stop (it takes locks the interrupted main
+     thread may already hold).
+
+Read more here:
+    https://docs.python.org/3/library/profile.html
+    https://www.brendangregg.com/flamegraphs.html
+"""
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+from .exceptions import abort
+from .globals import request, response
+
+
+def _token_matches(value, token):
+    return value is not None and hmac.compare_digest(value.encode(), token.encode())
+
+
+class RequestProfiler:
+    def __init__(self, app=None, token=None, header="X-Osa-Profile", query_param="__profile",
+                 output_dir=None, sort="cumulative", limit=50):
+        if not token:
+            raise ValueError("RequestProfiler needs a secret token, anyone could slow down the app otherwise.")
+        self.token = token
+        self.environ_key = "HTTP_" + header.upper().replace("-", "_")
+        self.query_param = query_param
+        self.output_dir = output_dir
+        self.sort = sort
+        self.limit = limit
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.profiler = self
+
+    def wants(self, environ):
+        """
+        Should this request be profiled?
+        """
+        if _token_matches(environ.get(self.environ_key), self.token):
+            return True
+        query = environ.get("QUERY_STRING", "")
+        if self.query_param not in query:
+            return False
+        values = parse_qs(query).get(self.query_param)
+        return bool(values) and _token_matches(values[0], self.token)
+
+    def profile(self, handle, environ, start_response):
+        """
+        Run `handle(environ, start_response)` under cProfile.
+        """
+        profile = cProfile.Profile()
+        captured = []
+
+        def capture_response(status, headers, exc_info=None):
+            captured[:] = [status, headers]
+
+        profile.enable()
+        try:
+            result = handle(environ, capture_response)
+            # The body is part of the work of the request (e.g. streamed responses)
+            body = b"".join(result)
+            if hasattr(result, "close"):
+                result.close()
+        finally:
+            profile.disable()
+
+        status, headers = captured
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+            route = environ.get("osa.route") or environ.get("PATH_INFO", "")
+            name = "".join(c if c.isalnum() else "_" for c in route).strip("_") or "root"
+            path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{name}.prof")
+            profile.dump_stats(path)
+            start_response(status, list(headers) + [("X-Osa-Profile-File", path)])
+            return [body]
+
+        report = io.StringIO()
+        stats = pstats.Stats(profile, stream=report)
+        stats.sort_stats(self.sort).print_stats(self.limit)
+        text = f"Profile of {environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')} -> {status}\n\n"
+        body = (text + report.getvalue()).encode()
+        start_response("200 OK", [("Content-Type", "text/plain; charset=utf-8"), ("Content-Length", str(len(body)))])
+        return [body]
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, app=None, interval=0.01, output_dir=".", admin_path="/_osa/profiler",
+                 token=None, signal_number=getattr(signal, "SIGUSR2", None), max_depth=128):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.admin_path = admin_path
+        self.token = token
+        self.signal_number = signal_number
+        self.max_depth = max_depth
+        self.in_flight = {}  # thread id -> environ of the request it serves
+        self.samples = Counter()
+        self.running = False
+        self.started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._toggle_requested = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Track the in-flight requests of the app, register the admin endpoint (when a token
+        is given) and the start/stop signal (when called from the main thread).
+        """
+        app.sampler = self
+        if self.admin_path and self.token:
+            app.router.add_route(self.admin_path, self.admin_view, ["GET", "POST"])
+        if self.signal_number is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(self.signal_number, self._on_signal)
+            self._start_control()
+            if hasattr(os, "register_at_fork"):
+                # Threads do not survive fork(), a worker starts its own control thread
+                os.register_at_fork(after_in_child=self._start_control)
+
+    # Called by the app for every request
+
+    def enter(self, environ):
+        self.in_flight[threading.get_ident()] = environ
+
+    def leave(self):
+        self.in_flight.pop(threading.get_ident(), None)
+
+    # Sampling
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            self.started_at = time.time()
+            self.samples = Counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="osa-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and write the collapsed stacks, returns the path of the file.
+        """
+        with self._lock:
+            if not self.running:
+                return None
+            self.running = False
+            self._stop.set()
+            thread = self._thread
+        if thread is not threading.current_thread():
+            thread.join()
+        return self.dump()
+
+    def toggle(self):
+        if self.running:
+            path = self.stop()
+            sys.stderr.write(f"[{os.getpid()}] Sampling profiler stopped, wrote {path}\n")
+        else:
+            self.start()
+            sys.stderr.write(f"[{os.getpid()}] Sampling profiler started\n")
+
+    def _on_signal(self, signum, frame):
+        # The handler runs in the main thread between two bytecodes, maybe inside start()
+        # or stop(): taking self._lock here could deadlock, the control thread does it.
+        self._toggle_requested.set()
+
+    def _start_control(self):
+        self._toggle_requested = threading.Event()
+        thread = threading.Thread(target=self._control, name="osa-sampler-control", daemon=True)
+        thread.start()
+
+    def _control(self):
+        toggle_requested = self._toggle_requested
+        while True:
+            toggle_requested.wait()
+            toggle_requested.clear()
+            self.toggle()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """
+        Capture the stack of every in-flight request once.
+        """
+        frames = sys._current_frames()
+        for thread_id, environ in list(self.in_flight.items()):
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            route = environ.get("osa.route") or "<unmatched>"
+            stack.append(route)
+            stack.reverse()
+            self.samples[";".join(stack)] += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+    def dump(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        started = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        path = os.path.join(self.output_dir, f"osa-profile-{os.getpid()}-{started}.collapsed")
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+        return path
+
+    # Admin endpoint
+
+    def admin_view(self):
+        """
+        ?action=start|stop|status, the token goes in X-Osa-Profile-Token or ?token=.
+        """
+        token = request.headers.get("X-Osa-Profile-Token") or request.GET.get("token")
+        if not _token_matches(token, self.token):
+            abort(403)
+        action = request.params.get("action", "status")
+        if action == "start":
+            self.start()
+            response.text = "sampling profiler started\n"
+        elif action == "stop":
+            path = self.stop()
+            response.text = f"sampling profiler stopped, wrote {path}\n" if path else "sampling profiler is not running\n"
+        elif action == "status":
+            state = "running" if self.running else "stopped"
+            response.text = f"sampling profiler {state}, {sum(self.samples.values())} samples\n"
+        else:
+            abort(400)
@@ -0,0 +1,648 @@
+"""
+An event-loop HTTP/1.1 server engine for Osa (`osa run --engine=selectors`).
+
+wsgiref closes the connection after every response and handles one request at a time.
+This engine keeps connections open instead:
+
+1. Event loop:
+   - One thread runs a `selectors` loop that accepts connections, reads requests and
+     writes responses. Sockets are non-blocking, so a slow client never blocks anyone.
+
+2. Persistent connections and pipelining:
+   - HTTP/1.1 connections stay open after a response unless the client sends
+     `Connection: close` (HTTP/1.0 clients can ask for `Connection: keep-alive`).
+   - Requests a client pipelines on the same connection are answered in order.
+
+3. Chunked transfer:
+   - Request bodies sent with `Transfer-Encoding: chunked` are decoded before the app sees them,
+     as they arrive (each recv only decodes the new bytes).
+   - Responses without a Content-Length are sent chunked to HTTP/1.1 clients, and
+     streamed to the client while the app is still producing them.
+
+4. Worker threads:
+   - The WSGI app runs on a thread pool, the event loop never runs application code.
+
+5. Timeouts:
+   - idle_timeout closes keep-alive connections that do not send a new request.
+   - request_timeout closes connections that send a request (or read a response) too slowly.
+
+Read more here:
+    https://www.rfc-editor.org/rfc/rfc9112  (HTTP/1.1 message syntax, persistence, chunked coding)
+    https://peps.python.org/pep-3333/
+    https://docs.python.org/3/library/selectors.html
+"""
+
+import selectors
+import socket
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from io import BytesIO
+from urllib.parse import unquote_to_bytes
+
+READ = selectors.EVENT_READ
+WRITE = selectors.EVENT_WRITE
+
+
+class BadRequest(Exception):
+    def __init__(self, status=400):
+        self.status = status
+
+
+class Connection:
+    __slots__ = (
+        "sock", "addr", "inbuf", "outbuf", "cond", "events", "busy", "done", "keep_alive",
+        "closed", "last_activity", "request_started", "continue_sent", "chunked",
+    )
+
+    def __init__(self, sock, addr, now):
+        self.sock = sock
+        self.addr = addr
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        # Guards outbuf, shared between the event loop and the worker thread
+        self.cond = threading.Condition()
+        self.events = 0
+        self.busy = False  # a request of this connection is being handled by the app
+        self.done = False  # the app finished and the whole response is in outbuf
+        self.keep_alive = True
+        self.closed = False
+        self.last_activity = now
+        self.request_started = None
+        self.continue_sent = False
+        self.chunked = None  # ChunkedDecoder of the request body being received
+
+
+class ChunkedDecoder:
+    """
+    Decodes a chunked body while it arrives. The decoded chunks and the offset parsed so far
+    are kept between calls, so each call only parses the bytes received since the last one
+    (re-decoding the whole body on every recv would be quadratic in its size).
+    """
+    __slots__ = ("pos", "body", "trailer")
+
+    max_line_size = 8192  # chunk size line (with extensions) or trailer line
+
+    def __init__(self, start):
+        self.pos = start
+        self.body = bytearray()
+        self.trailer = False
+
+    def feed(self, buf):
+        """
+        Returns (body, end) once the body is complete, None until then.
+        """
+        pos = self.pos
+        try:
+            while True:
+                line_end = buf.find(b"\r\n", pos, pos + self.max_line_size + 2)
+                if line_end < 0:
+                    if len(buf) - pos > self.max_line_size:
+                        raise BadRequest()
+                    return None
+                if self.trailer:
+                    # Skip the (optional) trailer section
+                    if line_end == pos:
+                        return bytes(self.body), line_end + 2
+                    pos = line_end + 2
+                    continue
+                size_line = bytes(buf[pos:line_end]).split(b";", 1)[0].strip()
+                try:
+                    size = int(size_line, 16)
+                except ValueError:
+                    raise BadRequest()
+                if size == 0:
+                    self.trailer = True
+                    pos = line_end + 2
+                    continue
+                data_start = line_end + 2
+                if len(buf) < data_start + size + 2:
+                    return None
+                if buf[data_start + size:data_start + size + 2] != b"\r\n":
+                    raise BadRequest()
+                self.body += buf[data_start:data_start + size]
+                pos = data_start + size + 2
+        finally:
+            self.pos = pos
+
+
+def parse_chunked(buf, start):
+    """
+    Decode a chunked body starting at `start` in one go.
+    Returns (body, end) or None if the body is not complete yet.
+    """
+    return ChunkedDecoder(start).feed(buf)
+
+
+class SelectorServer:
+    def __init__(self, app, sock, threads=8, idle_timeout=15, request_timeout=30,
+                 max_header_size=65536, max_body_size=100 * 1024 * 1024,
+                 write_buffer_size=256 * 1024, graceful_timeout=30, poll_interval=0.5):
+        self.app = app
+        self.socket = sock
+        self.socket.setblocking(False)
+        self.server_name, self.server_port = sock.getsockname()[:2]
+        self.pool = ThreadPoolExecutor(max_workers=max(1, threads))
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.write_buffer_size = write_buffer_size
+        self.graceful_timeout = graceful_timeout
+        self.poll_interval = poll_interval
+        self.selector = selectors.DefaultSelector()
+        self.connections = set()
+        self.running = False
+        # Worker threads hand connections with new output back to the loop through `_ready`
+        # and wake it up by writing to a socket pair.
+        self._ready = deque()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+    # Event loop
+
+    def serve_forever(self):
+        self.running = True
+        self.selector.register(self.socket, READ, "accept")
+        self.selector.register(self._wake_r, READ, "wake")
+        try:
+            last_sweep = time.monotonic()
+            while self.running:
+                self.run_once()
+                now = time.monotonic()
+                if now - last_sweep >= min(1.0, self.poll_interval):
+                    self.sweep(now)
+                    last_sweep = now
+            self.drain()
+        finally:
+            # Closing first unblocks workers waiting for buffer space
+            for conn in list(self.connections):
+                self.close(conn)
+            self.pool.shutdown(wait=True)
+            self.selector.close()
+            self._wake_r.close()
+            self._wake_w.close()
+
+    def run_once(self):
+        for key, mask in self.selector.select(self.poll_interval):
+            if key.data == "accept":
+                self.accept()
+            elif key.data == "wake":
+                self.handle_wakeup()
+            else:
+                conn = key.data
+                if mask & READ:
+                    self.on_readable(conn)
+                if mask & WRITE and not conn.closed:
+                    self.on_writable(conn)
+
+    def stop(self):
+        """
+        Stop accepting connections and finish the requests in progress.
+        Safe to call from a signal handler or another thread.
+        """
+        self.running = False
+        self.wakeup()
+
+    def drain(self):
+        self.selector.unregister(self.socket)
+        deadline = time.monotonic() + self.graceful_timeout
+        while time.monotonic() < deadline:
+            for conn in list(self.connections):
+                conn.keep_alive = False
+                if not conn.busy and not conn.outbuf:
+                    self.close(conn)
+            if not self.connections:
+                return
+            self.run_once()
+
+    def sweep(self, now):
+        """
+        Close idle keep-alive connections and clients that are too slow.
+        """
+        for conn in list(self.connections):
+            if conn.busy:
+                # The app is running, or we are waiting for the client to read the response
+                if conn.events & WRITE and now - conn.last_activity > self.request_timeout:
+                    self.close(conn)
+            elif conn.request_started is not None:
+                if now - conn.request_started > self.request_timeout:
+                    self.send_error(conn, 408)
+            elif now - conn.last_activity > self.idle_timeout:
+                self.close(conn)
+
+    def set_events(self, conn, events):
+        if conn.closed or events == conn.events:
+            return
+        if not events:
+            self.selector.unregister(conn.sock)
+        elif not conn.events:
+            self.selector.register(conn.sock, events, conn)
+        else:
+            self.selector.modify(conn.sock, events, conn)
+        conn.events = events
+
+    def close(self, conn):
+        if conn.closed:
+            return
+        self.set_events(conn, 0)
+        with conn.cond:
+            conn.closed = True
+            conn.cond.notify_all()
+        self.connections.discard(conn)
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+
+    def wakeup(self):
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # the loop is already awake
+
+    def handle_wakeup(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self._ready:
+            conn = self._ready.popleft()
+            if not conn.closed:
+                self.set_events(conn, WRITE)
+
+    # Reading requests
+
+    def accept(self):
+        while True:
+            try:
+                sock, addr = self.socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return  # nothing left, or another worker process took it
+            except OSError:
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = Connection(sock, addr, time.monotonic())
+            self.connections.add(conn)
+            self.set_events(conn, READ)
+
+    def on_readable(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.close(conn)
+            return
+        conn.last_activity = time.monotonic()
+        if conn.request_started is None:
+            conn.request_started = conn.last_activity
+        conn.inbuf += data
+        self.process_input(conn)
+
+    def process_input(self, conn):
+        """
+        Start the next request of the connection if it is complete.
+        """
+        try:
+            request = self.parse_request(conn)
+        except BadRequest as e:
+            self.send_error(conn, e.status)
+            return
+        if request is None:
+            # Not complete yet, wait for more data
+            if conn.inbuf and conn.request_started is None:
+                conn.request_started = time.monotonic()
+            if not conn.outbuf:
+                self.set_events(conn, READ)
+            return
+        environ, version, method = request
+        conn.busy = True
+        conn.done = False
+        conn.request_started = None
+        # Stop reading while the app works, pipelined requests wait in inbuf
+        self.set_events(conn, 0)
+        self.pool.submit(self.handle_request, conn, environ, version, method)
+
+    def parse_request(self, conn):
+        buf = conn.inbuf
+        # Tolerate empty lines between pipelined requests
+        while buf.startswith(b"\r\n"):
+            del buf[:2]
+        if not buf:
+            conn.request_started = None
+            return None
+        header_end = buf.find(b"\r\n\r\n")
+        if header_end < 0:
+            if len(buf) > self.max_header_size:
+                raise BadRequest(431)
+            return None
+        lines = bytes(buf[:header_end]).decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise BadRequest()
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise BadRequest(505)
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if not sep or not name or name != name.strip():
+                raise BadRequest()
+            name = name.lower()
+            value = value.strip()
+            headers[name] = f"{headers[name]},{value}" if name in headers else value
+
+        body_start = header_end + 4
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            if conn.chunked is None:
+                conn.chunked = ChunkedDecoder(body_start)
+            parsed = conn.chunked.feed(buf)
+            if parsed is None:
+                self.maybe_send_continue(conn, headers, version)
+                if len(buf) - body_start > self.max_body_size:
+                    raise BadRequest(413)
+                return None
+            body, end = parsed
+            conn.chunked = None
+            headers.pop("transfer-encoding")
+            headers["content-length"] = str(len(body))
+        else:
+            try:
+                length = int(headers.get("content-length", 0))
+            except ValueError:
+                raise BadRequest()
+            if length < 0:
+                raise BadRequest()
+            if length > self.max_body_size:
+                raise BadRequest(413)
+            end = body_start + length
+            if len(buf) < end:
+                self.maybe_send_continue(conn, headers, version)
+                return None
+            body = bytes(buf[body_start:end])
+        del buf[:end]
+        conn.continue_sent = False
+
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            conn.keep_alive = "close" not in connection
+        else:
+            conn.keep_alive = "keep-alive" in connection
+        if not self.running:
+            conn.keep_alive = False
+        return self.make_environ(conn, method, target, version, headers, body), version, method
+
+    def maybe_send_continue(self, conn, headers, version):
+        if (version == "HTTP/1.1" and not conn.continue_sent
+                and headers.get("expect", "").lower() == "100-continue"):
+            conn.continue_sent = True
+            conn.outbuf += b"HTTP/1.1 100 Continue\r\n\r\n"
+            self.set_events(conn, READ | WRITE)
+
+    def make_environ(self, conn, method, target, version, headers, body):
+        path, _, query = target.partition("?")
+        if "://" in path:  # absolute-form, e.g. from a proxy
+            path = "/" + path.split("://", 1)[1].partition("/")[2]
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote_to_bytes(path).decode("latin-1"),
+            "QUERY_STRING": query,
+            "SERVER_NAME": self.server_name,
+            "SERVER_PORT": str(self.server_port),
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": conn.addr[0] if isinstance(conn.addr, tuple) else "",
+            "REMOTE_PORT": str(conn.addr[1]) if isinstance(conn.addr, tuple) else "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers.items():
+            if "_" in name:
+                continue  # ambiguous with "-" once converted to a CGI variable
+            if name == "content-type":
+                environ["CONTENT_TYPE"] = value
+            elif name == "content-length":
+                environ["CONTENT_LENGTH"] = value
+            else:
+                environ["HTTP_" + name.upper().replace("-", "_")] = value
+        return environ
+
+    def send_error(self, conn, status):
+        """
+        Answer a request the server could not parse and close the connection.
+        """
+        status = HTTPStatus(status)
+        body = f"{status.value} {status.phrase}\n".encode()
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: text/plain\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n"
+        ).encode("latin-1")
+        conn.keep_alive = False
+        conn.busy = True
+        conn.done = True
+        conn.inbuf.clear()
+        with conn.cond:
+            conn.outbuf += head + body
+        self.set_events(conn, WRITE)
+
+    # Writing responses
+
+    def on_writable(self, conn):
+        with conn.cond:
+            try:
+                sent = conn.sock.send(conn.outbuf) if conn.outbuf else 0
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                sent = -1
+            if sent < 0:
+                conn.outbuf.clear()
+            else:
+                del conn.outbuf[:sent]
+            conn.cond.notify_all()  # wake a worker waiting for buffer space
+            pending = bool(conn.outbuf)
+            finished = conn.done and not pending
+        if sent < 0:
+            self.close(conn)
+            return
+        conn.last_activity = time.monotonic()
+        if pending:
+            return
+        if finished:
+            self.finish_response(conn)
+        elif conn.busy:
+            self.set_events(conn, 0)  # wait for the app to produce more output
+        else:
+            self.set_events(conn, READ)  # only "100 Continue" was sent
+
+    def finish_response(self, conn):
+        conn.busy = False
+        conn.done = False
+        if not conn.keep_alive:
+            self.close(conn)
+            return
+        # Answer the next pipelined request, or wait for one
+        self.process_input(conn)
+
+    def send(self, conn, data, done=False):
+        """
+        Called from worker threads to queue output for the connection.
+        """
+        with conn.cond:
+            while len(conn.outbuf) > self.write_buffer_size and not conn.closed:
+                conn.cond.wait(self.request_timeout)
+            if conn.closed:
+                raise ConnectionError("Client disconnected")
+            conn.outbuf += data
+            if done:
+                conn.done = True
+        self._ready.append(conn)
+        self.wakeup()
+
+    # Running the app (in worker threads)
+
+    def handle_request(self, conn, environ, version, method):
+        exchange = Exchange(self, conn, version, method)
+        try:
+            result = self.app(environ, exchange.start_response)
+            try:
+                for data in result:
+                    if data:
+                        exchange.write(data)
+                exchange.finish()
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        except ConnectionError:
+            pass
+        except Exception:
+            traceback.print_exc()
+            if exchange.headers_sent:
+                # Too late for an error page, the client sees a truncated response
+                conn.keep_alive = False
+                try:
+                    self.send(conn, b"", done=True)
+                except ConnectionError:
+                    pass
+            else:
+                exchange.status = "500 Internal Server Error"
+                exchange.headers = [("Content-Type", "text/plain")]
+                exchange.buffered = []
+                try:
+                    exchange.write(b"500 Internal Server Error\n")
+                    exchange.finish()
+                except ConnectionError:
+                    pass
+
+
+_date_cache = [0, ""]
+
+
+def http_date():
+    now = int(time.time())
+    if _date_cache[0] != now:
+        _date_cache[:] = [now, formatdate(now, usegmt=True)]
+    return _date_cache[1]
+
+
+class Exchange:
+    """
+    The WSGI side of one request: start_response, and framing of the response body.
+    """
+    def __init__(self, server, conn, version, method):
+        self.server = server
+        self.conn = conn
+        self.version = version
+        self.head_only = method == "HEAD"
+        self.status = None
+        self.headers = None
+        self.headers_sent = False
+        self.chunked = False
+        self.body_allowed = True
+        self.buffered = []
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info:
+            try:
+                if self.headers_sent:
+                    raise exc_info[1].with_traceback(exc_info[2])
+            finally:
+                exc_info = None
+        elif self.status is not None:
+            raise AssertionError("start_response called a second time without exc_info")
+        self.status = status
+        self.headers = list(headers)
+        return self.write
+
+    def send_headers(self, body_length=None):
+        conn = self.conn
+        code = int(self.status.split(" ", 1)[0])
+        self.body_allowed = not (self.head_only or code < 200 or code in (204, 304))
+        names = {name.lower() for name, _ in self.headers}
+        if "content-length" not in names and self.body_allowed:
+            if body_length is not None:
+                self.headers.append(("Content-Length", str(body_length)))
+            elif self.version == "HTTP/1.1":
+                self.chunked = True
+                self.headers.append(("Transfer-Encoding", "chunked"))
+            else:
+                conn.keep_alive = False  # the end of the body is the end of the connection
+        if "date" not in names:
+            self.headers.append(("Date", http_date()))
+        if "server" not in names:
+            self.headers.append(("Server", "osa"))
+        if not conn.keep_alive:
+            self.headers.append(("Connection", "close"))
+        elif self.version == "HTTP/1.0":
+            self.headers.append(("Connection", "keep-alive"))
+        lines = [f"{self.version} {self.status}\r\n"]
+        lines.extend(f"{name}: {value}\r\n" for name, value in self.headers)
+        lines.append("\r\n")
+        self.headers_sent = True
+        return "".join(lines).encode("latin-1")
+
+    def write(self, data):
+        if self.status is None:
+            raise AssertionError("write() before start_response()")
+        if not self.headers_sent:
+            # Hold back the first chunk, if it is the whole body we can send a Content-Length
+            if not self.buffered:
+                self.buffered.append(data)
+                return
+            pending = self.send_headers() + self.frame(b"".join(self.buffered))
+            self.buffered = []
+            self.server.send(self.conn, pending + self.frame(data))
+            return
+        self.server.send(self.conn, self.frame(data))
+
+    def frame(self, data):
+        if not self.body_allowed or not data:
+            return b""
+        if self.chunked:
+            return b"%x\r\n%s\r\n" % (len(data), data)
+        return data
+
+    def finish(self):
+        if not self.headers_sent:
+            body = b"".join(self.buffered)
+            self.buffered = []
+            self.server.send(self.conn, self.send_headers(len(body)) + self.frame(body), done=True)
+            return
+        self.server.send(self.conn, b"0\r\n\r\n" if self.chunked and self.body_allowed else b"", done=True)
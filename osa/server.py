@@ -0,0 +1,306 @@
+"""
+A small pre-fork WSGI server, so an Osa app can run on several cores without gunicorn.
+
+How it works:
+
+1. The parent process (the arbiter) loads the app once and opens the listening socket.
+2. It forks N worker processes. Every worker inherits the app and the socket and
+   accepts connections from it. With reuse_port=True every worker opens its own
+   socket with SO_REUSEPORT instead and the kernel balances connections between them.
+3. Every worker serves requests with wsgiref, either one at a time or with a pool of threads,
+   or with the keep-alive event loop from `osa.selector_server` (engine="selectors").
+4. The arbiter watches its workers:
+   - a worker that crashes is replaced by a new one.
+   - SIGHUP: reload the app (when an app_loader is given), start new workers and
+     gracefully stop the old ones.
+   - SIGTERM / SIGINT: stop accepting connections, let the workers finish the requests
+     they are serving and exit.
+
+Read more about the pre-fork model here:
+    https://docs.gunicorn.org/en/stable/design.html
+    https://lwn.net/Articles/542629/  (SO_REUSEPORT)
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+
+def log(message):
+    sys.stderr.write(f"[{os.getpid()}] {message}\n")
+    sys.stderr.flush()
+
+
+def create_socket(host, port, reuse_port=False, backlog=2048, listen=True):
+    """
+    Create the listening TCP socket shared by the workers.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("SO_REUSEPORT is not supported on this platform.")
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    if listen:
+        sock.listen(backlog)
+    return sock
+
+
+class WSGIWorker(WSGIServer):
+    """
+    A wsgiref server that serves an already listening socket,
+    optionally dispatching connections to a pool of threads.
+    """
+    def __init__(self, app, sock, threads=1, poll_interval=0.5):
+        super().__init__(sock.getsockname()[:2], WSGIRequestHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        # The socket is shared between processes, another worker may win the accept()
+        self.socket.setblocking(False)
+        self.server_name = socket.getfqdn(self.server_address[0])
+        self.server_port = self.server_address[1]
+        self.setup_environ()
+        self.set_app(app)
+        self.timeout = poll_interval
+        self.running = False
+        self.pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+        # A connection is accepted only when a thread is free to serve it, otherwise a busy
+        # worker would queue connections that an idle worker could serve right away
+        self.free_threads = threading.BoundedSemaphore(threads) if threads > 1 else None
+        self._slot_held = False
+
+    def get_request(self):
+        conn, addr = self.socket.accept()
+        conn.setblocking(True)
+        return conn, addr
+
+    def process_request(self, request, client_address):
+        if self.pool is None:
+            return super().process_request(request, client_address)
+        self.pool.submit(self.process_request_thread, request, client_address)
+        self._slot_held = False  # the thread releases it
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.free_threads.release()
+
+    def serve_forever(self, poll_interval=None):
+        """
+        Serve until `stop` is called (e.g. from a signal handler).
+        """
+        self.running = True
+        parent = os.getppid()
+        try:
+            while self.running:
+                if self.free_threads is None:
+                    self.handle_request()
+                elif self.free_threads.acquire(timeout=self.timeout):
+                    self._slot_held = True
+                    self.handle_request()
+                    if self._slot_held:
+                        # Nothing was accepted (timeout, another worker won the accept)
+                        self._slot_held = False
+                        self.free_threads.release()
+                # Exit if the arbiter went away
+                if os.getppid() != parent:
+                    break
+        finally:
+            if self.pool is not None:
+                # Drain: finish the requests that were already accepted
+                self.pool.shutdown(wait=True)
+
+    def stop(self):
+        self.running = False
+
+
+class PreforkServer:
+    def __init__(self, app, host="127.0.0.1", port=8300, workers=2, threads=1,
+                 reuse_port=False, app_loader=None, graceful_timeout=30, worker_class=WSGIWorker):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("The pre-fork server needs os.fork(), which is not available on this platform.")
+        self.app = app
+        self.host = host
+        self.port = port
+        self.num_workers = workers
+        self.threads = threads
+        self.reuse_port = reuse_port
+        self.app_loader = app_loader
+        self.graceful_timeout = graceful_timeout
+        self.worker_class = worker_class
+        self.socket = None
+        self.workers = {}  # pid -> generation
+        self.generation = 0
+        self._stopping = False
+        self._reload = False
+
+    def run(self):
+        # With SO_REUSEPORT the arbiter only reserves the port, the workers listen.
+        self.socket = create_socket(self.host, self.port, self.reuse_port, listen=not self.reuse_port)
+        self.port = self.socket.getsockname()[1]
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+        log(f"Starting {self.num_workers} workers on http://{self.host}:{self.port}")
+        try:
+            self.manage_workers()
+            while not self._stopping:
+                self.reap_workers()
+                if self._reload:
+                    self.reload()
+                self.manage_workers()
+                time.sleep(0.2)
+        finally:
+            self.stop_workers()
+            self.socket.close()
+
+    def handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def handle_reload(self, signum, frame):
+        self._reload = True
+
+    def manage_workers(self):
+        """
+        Keep `num_workers` workers of the current generation running.
+        """
+        current = [pid for pid, gen in self.workers.items() if gen == self.generation]
+        for _ in range(self.num_workers - len(current)):
+            if self._stopping:
+                return
+            self.spawn_worker()
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = self.generation
+            return pid
+        # In the worker
+        exit_code = 0
+        try:
+            exit_code = self.run_worker()
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def run_worker(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # the arbiter decides when to stop
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        sock = self.socket
+        if self.reuse_port:
+            sock.close()
+            sock = create_socket(self.host, self.port, reuse_port=True)
+        worker = self.worker_class(self.app, sock, self.threads)
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        log("Worker booted")
+        worker.serve_forever()
+        # The worker leaves with os._exit(), atexit handlers do not run: flush the access log here
+        access_log = getattr(self.app, "access_log", None)
+        if access_log is not None:
+            access_log.close()
+        return 0
+
+    def reap_workers(self):
+        """
+        Collect exited workers, unexpected exits are replaced by `manage_workers`.
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            generation = self.workers.pop(pid, None)
+            if generation == self.generation and not self._stopping:
+                log(f"Worker {pid} exited unexpectedly (status {status}), restarting it")
+
+    def reload(self):
+        self._reload = False
+        if self.app_loader is not None:
+            try:
+                self.app = self.app_loader()
+            except Exception:
+                traceback.print_exc()
+                log("Reload failed, keeping the running workers")
+                return
+        old_workers = list(self.workers)
+        self.generation += 1
+        log("Reloading workers")
+        self.manage_workers()
+        for pid in old_workers:
+            self.kill_worker(pid, signal.SIGTERM)
+
+    def kill_worker(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+
+    def stop_workers(self):
+        """
+        Ask every worker to finish its requests, kill the ones that take too long.
+        """
+        self._stopping = True
+        for pid in list(self.workers):
+            self.kill_worker(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap_workers()
+            time.sleep(0.05)
+        for pid in list(self.workers):
+            self.kill_worker(pid, signal.SIGKILL)
+        while self.workers:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self.workers.pop(pid, None)
+        log("Shutdown complete")
+
+
+def get_worker_class(engine):
+    """
+    The server class every worker runs: "wsgiref" or "selectors".
+    """
+    if engine == "wsgiref":
+        return WSGIWorker
+    if engine == "selectors":
+        from .selector_server import SelectorServer
+        return SelectorServer
+    raise ValueError(f"Unknown server engine {engine!r}.")
+
+
+def serve(app, host="127.0.0.1", port=8300, workers=1, threads=None, reuse_port=False,
+          app_loader=None, engine="wsgiref"):
+    """
+    Run the app with `workers` processes of `threads` threads each.
+    """
+    worker_class = get_worker_class(engine)
+    if threads is None:
+        threads = 8 if engine == "selectors" else 1
+    if workers > 1:
+        return PreforkServer(app, host, port, workers, threads, reuse_port, app_loader,
+                             worker_class=worker_class).run()
+    server = worker_class(app, create_socket(host, port, reuse_port), threads)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.socket.close()
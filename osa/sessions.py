@@ -0,0 +1,320 @@
+"""
+Sessions for Osa, loaded lazily and written only when they change.
+
+    from osa import session
+    from osa.sessions import SignedCookieSessionStore
+
+    SignedCookieSessionStore(app, secret_key="change-me")
+
+    @app.route("/visit")
+    def visit():
+        session["visits"] = session.get("visits", 0) + 1
+
+How it works:
+
+1. Lazy loading:
+   - For every request the app only puts a small SessionSlot in the `session` context variable.
+   - The cookie is read (and the server-side store queried) the first time the view uses `session`.
+     A request that never touches the session never pays for it.
+
+2. Write on change:
+   - Session is a dict that remembers if it was modified. After the view and the after_request
+     hooks, the session is saved (and the cookie sent) only if it was loaded and modified.
+   - Changing a mutable value in place (session["cart"].append(...)) is not seen,
+     set `session.modified = True` in that case.
+
+3. Stores:
+   - SignedCookieSessionStore: the whole session lives in the cookie, as JSON signed with
+     HMAC-SHA256, so the client can read it but not change it. Keep it small.
+   - MemorySessionStore: the cookie holds a random session id, the data is kept in memory
+     (LRU with a maximum number of sessions and a TTL). Per process.
+   - SQLiteSessionStore: same, but the data is kept in an SQLite file shared by all the
+     processes of the machine (e.g. the workers of the pre-fork server).
+   - CacheSessionStore: same, the data is kept in a backend of osa.cache, e.g. a
+     SharedMemoryCache shared by the workers of the pre-fork server.
+
+Read more here:
+    https://developer.mozilla.org/en-US/docs/Web/HTTP/Cookies
+    https://cheatsheetseries.owasp.org/cheatsheets/Session_Management_Cheat_Sheet.html
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from .globals import request
+
+
+def _mutator(name):
+    method = getattr(dict, name)
+
+    def mutate(self, *args, **kwargs):
+        self.modified = True
+        return method(self, *args, **kwargs)
+    mutate.__name__ = name
+    return mutate
+
+
+class Session(dict):
+    """
+    A dict that tracks changes. `new` is True if the client did not send a session.
+    """
+    __slots__ = ("sid", "new", "modified")
+
+    def __init__(self, data=None, sid=None, new=True):
+        super().__init__(data or {})
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+    for _name in ("__setitem__", "__delitem__", "clear", "pop", "popitem", "setdefault", "update"):
+        locals()[_name] = _mutator(_name)
+    del _name
+
+
+class SessionSlot:
+    """
+    Holds the session of the current request, loading it on first access.
+    """
+    __slots__ = ("store", "session")
+
+    def __init__(self, store):
+        self.store = store
+        self.session = None
+
+    def get(self):
+        if self.session is None:
+            self.session = self.store.open(request)
+        return self.session
+
+    def save(self, response):
+        if self.session is not None and self.session.modified:
+            self.store.save(self.session, response)
+
+
+class SessionStore:
+    """
+    Base class of the session stores, handles the cookie.
+    """
+    def __init__(self, app=None, cookie_name="osa_session", max_age=14 * 24 * 3600, path="/",
+                 domain=None, secure=False, httponly=True, samesite="Lax"):
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+        self.path = path
+        self.domain = domain
+        self.secure = secure
+        self.httponly = httponly
+        self.samesite = samesite
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.session_store = self
+
+    def open(self, request):
+        raise NotImplementedError
+
+    def save(self, session, response):
+        raise NotImplementedError
+
+    def set_cookie(self, response, value):
+        response.set_cookie(
+            self.cookie_name, value, max_age=self.max_age, path=self.path, domain=self.domain,
+            secure=self.secure, httponly=self.httponly, samesite=self.samesite,
+        )
+
+    def delete_cookie(self, response):
+        response.delete_cookie(self.cookie_name, path=self.path, domain=self.domain)
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class SignedCookieSessionStore(SessionStore):
+    def __init__(self, app=None, secret_key=None, **kwargs):
+        if not secret_key:
+            raise ValueError("SignedCookieSessionStore needs a secret_key to sign the cookies.")
+        self.secret_key = secret_key.encode() if isinstance(secret_key, str) else secret_key
+        super().__init__(app, **kwargs)
+
+    def sign(self, value):
+        return _b64encode(hmac.new(self.secret_key, value.encode("ascii"), hashlib.sha256).digest())
+
+    def dumps(self, data):
+        value = f"{_b64encode(json.dumps(data, separators=(',', ':')).encode())}.{int(time.time())}"
+        return f"{value}.{self.sign(value)}"
+
+    def loads(self, cookie):
+        """
+        Returns the data of a signed cookie, or None if it is invalid or expired.
+        """
+        try:
+            value, signature = cookie.rsplit(".", 1)
+            # compare_digest only accepts ASCII str, the cookie comes from the client
+            expected = self.sign(value).encode("ascii")
+            if not hmac.compare_digest(signature.encode("utf-8", "surrogateescape"), expected):
+                return None
+            payload, timestamp = value.split(".")
+            if self.max_age is not None and time.time() - int(timestamp) > self.max_age:
+                return None
+            data = json.loads(_b64decode(payload))
+        except (ValueError, UnicodeError):
+            return None
+        return data if isinstance(data, dict) else None
+
+    def open(self, request):
+        cookie = request.cookies.get(self.cookie_name)
+        data = self.loads(cookie) if cookie else None
+        return Session(data, new=data is None)
+
+    def save(self, session, response):
+        if not session:
+            if not session.new:
+                self.delete_cookie(response)
+            return
+        self.set_cookie(response, self.dumps(dict(session)))
+
+
+class ServerSideSessionStore(SessionStore):
+    """
+    Base class of the stores that keep the data on the server and a random id in the cookie.
+    Subclasses implement load, store and delete.
+    """
+    def open(self, request):
+        sid = request.cookies.get(self.cookie_name)
+        data = self.load(sid) if sid else None
+        if data is None:
+            return Session(new=True)
+        return Session(data, sid=sid, new=False)
+
+    def save(self, session, response):
+        if not session:
+            if session.sid:
+                self.delete(session.sid)
+                self.delete_cookie(response)
+            return
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        self.store(session.sid, dict(session))
+        # Sending the cookie again moves its expiry along with the data
+        self.set_cookie(response, session.sid)
+
+    def load(self, sid):
+        raise NotImplementedError
+
+    def store(self, sid, data):
+        raise NotImplementedError
+
+    def delete(self, sid):
+        raise NotImplementedError
+
+
+class MemorySessionStore(ServerSideSessionStore):
+    def __init__(self, app=None, max_entries=10000, **kwargs):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # sid -> (expires, data), least recently used first
+        self._lock = threading.Lock()
+        super().__init__(app, **kwargs)
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires is not None and expires < time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return dict(data)
+
+    def store(self, sid, data):
+        expires = time.time() + self.max_age if self.max_age is not None else None
+        with self._lock:
+            self._data[sid] = (expires, data)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class SQLiteSessionStore(ServerSideSessionStore):
+    def __init__(self, app=None, path="sessions.sqlite3", **kwargs):
+        self.db_path = path
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        super().__init__(app, **kwargs)
+
+    def _connection(self):
+        # SQLite connections must not be shared with forked processes, open one per process
+        if self._pid != os.getpid():
+            import sqlite3  # only apps with this store pay for the import
+            self._conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL)"
+            )
+            self._pid = os.getpid()
+        return self._conn
+
+    def load(self, sid):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT data, expires FROM sessions WHERE sid = ?", (sid,)
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def store(self, sid, data):
+        expires = time.time() + self.max_age if self.max_age is not None else None
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+                (sid, json.dumps(data, separators=(",", ":")), expires),
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                conn.execute("DELETE FROM sessions WHERE expires < ?", (time.time(),))
+
+    def delete(self, sid):
+        with self._lock:
+            self._connection().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+
+class CacheSessionStore(ServerSideSessionStore):
+    def __init__(self, app=None, cache=None, prefix="osa:session:", **kwargs):
+        if cache is None:
+            raise ValueError("CacheSessionStore needs a cache backend, e.g. osa.cache.SharedMemoryCache().")
+        self.cache = cache
+        self.prefix = prefix
+        super().__init__(app, **kwargs)
+
+    def load(self, sid):
+        return self.cache.get(self.prefix + sid)
+
+    def store(self, sid, data):
+        if not self.cache.set(self.prefix + sid, data, ttl=self.max_age):
+            raise ValueError(
+                f"Session {sid[:8]}... does not fit in the cache, "
+                "store less in the session or use larger cache slots."
+            )
+
+    def delete(self, sid):
+        self.cache.delete(self.prefix + sid)
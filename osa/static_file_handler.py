@@ -14,6 +14,9 @@ Abilities
    - The class supports caching of static files to improve performance. 
    - The cache_enabled attribute controls whether caching is enabled.
    - The cache_max_age attribute specifies the maximum age for cached responses.
+   - By default responses are cached in a dict of this process. With `cache=` (a backend of osa.cache,
+     e.g. SharedMemoryCache) the status, headers and body are stored there instead, for cache_max_age seconds,
+     so the workers of the pre-fork server share them.
 
 3. ETag Generation:
    - The class generates both strong and weak ETags for static files to facilitate efficient caching and validation.
@@ -47,11 +50,12 @@ from webob import Response, Request
 from osa.exceptions import HTTPException
 
 class StaticFileHandler:
-    def __init__(self, static_dir="static", cache_enabled=True, cache_max_age=3600, compress_enabled=True):
+    def __init__(self, static_dir="static", cache_enabled=True, cache_max_age=3600, compress_enabled=True, cache=None):
         self.static_dir = os.path.abspath(static_dir)
         self.cache_enabled = cache_enabled
         self.cache_max_age = cache_max_age
         self.compress_enabled = compress_enabled
+        self.cache = cache
         self._cache = {}
 
     def serve(self, path, request: Request):
@@ -60,15 +64,24 @@ class StaticFileHandler:
         if not os.path.isfile(file_path):
             raise HTTPException(404, "File not found")
 
-        if self.cache_enabled and path in self._cache:
-            response = self._get_cached_response(path, request)
-        else:
+        response = self._get_cached_response(path, request) if self.cache_enabled else None
+        if response is None:
             response = self._create_response(file_path, request)
-            if self.cache_enabled:
+            if self.cache_enabled and response.status_code == 200:
                 self._cache_response(path, response)
 
         return response
 
+    def __call__(self, environ, start_response):
+        """
+        The handler as a WSGI application, to mount it: app.mount("/media", StaticFileHandler("media")).
+        """
+        try:
+            response = self.serve(environ.get("PATH_INFO", ""), Request(environ))
+        except HTTPException as e:
+            response = Response(status=e.status, text=str(e))
+        return response(environ, start_response)
+
     def _get_full_path(self, path):
         # Prevent directory traversal attacks
         safe_path = os.path.normpath(path).lstrip(os.sep) # Remove leading slashes and normalize path .e.g, /../file.txt -> file.txt
@@ -118,10 +131,24 @@ class StaticFileHandler:
         return response
 
     def _cache_response(self, path, response):
-        self._cache[path] = response
+        if self.cache is None:
+            self._cache[path] = response
+        else:
+            # Shared backends hold plain data, not Response objects
+            value = (response.status, response.headerlist, response.body)
+            self.cache.set("osa:static:" + path, value, ttl=self.cache_max_age)
 
     def _get_cached_response(self, path, request):
-        cached_response = self._cache[path]
+        if self.cache is None:
+            cached_response = self._cache.get(path)
+        else:
+            value = self.cache.get("osa:static:" + path)
+            cached_response = None
+            if value is not None:
+                status, headerlist, body = value
+                cached_response = Response(body=body, status=status, headerlist=headerlist)
+        if cached_response is None:
+            return None
 
         # Handle If-None-Match to return 304 Not Modified if ETag matches
         if request.if_none_match and cached_response.headers.get('ETag') in request.if_none_match:
@@ -1,6 +1,8 @@
 # template_engine.py
 
 from jinja2 import Environment, FileSystemLoader
+from time import perf_counter
+from .globals import _timings_ctx_var
 import os
 
 class TemplateEngine:
@@ -11,4 +13,11 @@ class TemplateEngine:
     def render(self, template_name, context=None):
         if context is None:
             context = {}
-        return self.env.get_template(template_name).render(**context)
+        timings = _timings_ctx_var.get()
+        if timings is None:
+            return self.env.get_template(template_name).render(**context)
+        start = perf_counter()
+        try:
+            return self.env.get_template(template_name).render(**context)
+        finally:
+            timings.add("template", start, nested=True)
@@ -0,0 +1,222 @@
+"""
+An in-process test client for Osa apps.
+
+`app.test_client()` builds the WSGI environ of a request itself and calls the app directly,
+there is no HTTP client, adapter or socket in between, so tests stay fast even with
+thousands of requests:
+
+    client = app.test_client()
+    res = client.post("/items", json={"name": "osa"})
+    assert res.status_code == 201
+    assert res.json()["name"] == "osa"
+
+- Requests accept a relative ("/items") or absolute ("http://testserver/items") URL,
+  query `params`, a raw body (`data` as bytes/str), a form (`data` as dict), `json`,
+  `headers` and `cookies`.
+- Cookies set by the app are kept and sent back, like a browser would.
+- `client.concurrent([...], threads=8)` sends many requests at once from a thread pool,
+  to check that the request/response context of one request never leaks into another.
+"""
+
+import io
+import json as jsonlib
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import quote, urlencode, urlsplit, urljoin, unquote
+from wsgiref.headers import Headers
+
+_URL_SAFE = "/%:@!$&'()*+,;=~"
+
+
+def build_environ(method="GET", url="/", headers=None, body=b"", base_url="http://testserver"):
+    """
+    The WSGI environ (PEP 3333) of a request.
+    """
+    parts = urlsplit(urljoin(base_url + "/", url))
+    # Like an HTTP client: non-ASCII characters are sent as percent-encoded UTF-8,
+    # the server then decodes the bytes of the path as latin-1 (PEP 3333)
+    path = quote(parts.path, safe=_URL_SAFE)
+    query = quote(parts.query, safe=_URL_SAFE + "?")
+    scheme = parts.scheme or "http"
+    port = parts.port or (443 if scheme == "https" else 80)
+    environ = {
+        "REQUEST_METHOD": method.upper(),
+        "SCRIPT_NAME": "",
+        "PATH_INFO": unquote(path, "latin-1") or "/",
+        "QUERY_STRING": query,
+        "SERVER_NAME": parts.hostname or "testserver",
+        "SERVER_PORT": str(port),
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_HOST": parts.netloc or "testserver",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scheme,
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in (headers or {}).items():
+        key = name.upper().replace("-", "_")
+        if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[key] = str(value)
+        else:
+            environ["HTTP_" + key] = str(value)
+    return environ
+
+
+class TestResponse:
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, status, headers, content):
+        self.status = status
+        self.status_code = int(status.split(" ", 1)[0])
+        self.headers = Headers(list(headers))
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        content_type = self.headers.get("Content-Type", "")
+        charset = "utf-8"
+        for param in content_type.split(";")[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "charset" and value:
+                charset = value.strip('"')
+        return self.content.decode(charset, errors="replace")
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+    @property
+    def cookies(self):
+        """
+        Cookies set by this response, as a dict.
+        """
+        cookies = {}
+        for header in self.headers.get_all("Set-Cookie"):
+            cookie = SimpleCookie()
+            cookie.load(header)
+            for name, morsel in cookie.items():
+                cookies[name] = morsel.value
+        return cookies
+
+    def __repr__(self):
+        return f"<TestResponse [{self.status}]>"
+
+
+class TestClient:
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, app, base_url="http://testserver", use_cookies=True):
+        self.app = app
+        self.base_url = base_url.rstrip("/")
+        self.use_cookies = use_cookies
+        self.cookies = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, cookies=None,
+                follow_redirects=False):
+        headers = dict(headers or {})
+        body = b""
+        if json is not None:
+            body = jsonlib.dumps(json).encode()
+            headers.setdefault("Content-Type", "application/json")
+        elif isinstance(data, dict):
+            body = urlencode(data, doseq=True).encode()
+            headers.setdefault("Content-Type", "application/x-www-form-urlencoded")
+        elif data is not None:
+            body = data.encode() if isinstance(data, str) else data
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode(params, doseq=True)
+        with self._lock:
+            sent_cookies = dict(self.cookies) if self.use_cookies else {}
+        sent_cookies.update(cookies or {})
+        built_cookie = bool(sent_cookies) and "Cookie" not in headers
+        if built_cookie:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in sent_cookies.items())
+
+        environ = build_environ(method, url, headers, body, self.base_url)
+        res = self.call(environ)
+        if self.use_cookies:
+            self._store_cookies(res)
+        if follow_redirects and res.status_code in (301, 302, 303, 307, 308) and res.headers.get("Location"):
+            if res.status_code in (307, 308):
+                if built_cookie:
+                    # Built again from self.cookies, the redirect may have set new ones
+                    headers = {name: value for name, value in headers.items() if name != "Cookie"}
+                return self.request(method, res.headers["Location"], data=body or None,
+                                    headers=headers, cookies=cookies, follow_redirects=True)
+            return self.request("GET", res.headers["Location"], follow_redirects=True)
+        return res
+
+    def call(self, environ):
+        """
+        Call the app with a ready environ and collect the response.
+        """
+        captured = []
+
+        def start_response(status, response_headers, exc_info=None):
+            if exc_info and captured:
+                raise exc_info[1].with_traceback(exc_info[2])
+            captured[:] = [status, response_headers]
+
+        result = self.app(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        status, response_headers = captured
+        return TestResponse(status, response_headers, content)
+
+    def _store_cookies(self, res):
+        for header in res.headers.get_all("Set-Cookie"):
+            cookie = SimpleCookie()
+            cookie.load(header)
+            with self._lock:
+                for name, morsel in cookie.items():
+                    if morsel["max-age"] == "0" or "1970" in morsel["expires"]:
+                        self.cookies.pop(name, None)
+                    else:
+                        self.cookies[name] = morsel.value
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def options(self, url, **kwargs):
+        return self.request("OPTIONS", url, **kwargs)
+
+    def concurrent(self, requests, threads=8):
+        """
+        Send many requests at once from a pool of threads. `requests` is a list of
+        (method, url) or (method, url, kwargs), the responses come back in the same order.
+        """
+        def send(item):
+            method, url, *rest = item
+            return self.request(method, url, **(rest[0] if rest else {}))
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            return list(pool.map(send, requests))
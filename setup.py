@@ -6,18 +6,20 @@ setup(
     description='A simple web framework for Python developers to learn how some fundamental concepts of web frameworks work under the hood.',  
     author='Alyahyawy Osama',
     author_email='alyhyawyosama@gmail.com',
-    packages=find_packages(),  # Automatically find packages in the directory
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),  # Automatically find packages in the directory
     include_package_data=True,  # Include non-code files specified in MANIFEST.in
     install_requires=[
         'click',        # For command-line interface
         'webob',        # For request and response objects
-        'requests',     # For the test client
         'parse',        # For URL parsing
-        'requests-wsgi-adapter',  # For integrating with WSGI in the test client,
         'whitenoise',   # For serving static files
         'jinja2',       # For rendering templates
 
     ],
+    extras_require={
+        # Only for Osa.test_session, Osa.test_client has no dependencies
+        'requests': ['requests', 'requests-wsgi-adapter'],
+    },
     entry_points={
         'console_scripts': [
             'osa=osa.cli:main',  # Expose the CLI command
@@ -9,4 +9,4 @@ def app():
 
 @pytest.fixture
 def client(app):
-    return app.test_session(base_url=TEST_URL)
+    return app.test_client(base_url=TEST_URL)
@@ -0,0 +1,86 @@
+import io
+import json
+import threading
+from osa.access_log import AccessLogger
+from osa.compression import Compression
+from osa.globals import response
+from .utils import abs_url
+
+
+def test_access_log_records(app, client):
+    stream = io.StringIO()
+    logger = AccessLogger(app, stream=stream, flush_interval=0.01)
+
+    @app.route("/items/{item_id}")
+    def item(item_id):
+        response.text = "hello"
+
+    client.get(abs_url("/items/7"))
+    client.get(abs_url("/missing"))
+    logger.close()
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["method"] == "GET"
+    assert first["path"] == "/items/7"
+    assert first["route"] == "/items/{item_id}"
+    assert first["status"] == 200
+    assert first["bytes"] == 5
+    assert first["duration_ms"] >= 0
+    assert second["status"] == 404
+    assert second["route"] is None
+
+
+def test_access_log_counts_bytes_sent(app, client):
+    stream = io.StringIO()
+    logger = AccessLogger(app, stream=stream, flush_interval=0.01)
+    Compression(app, min_size=0)
+
+    @app.route("/stream")
+    def streamed():
+        response.app_iter = (chunk for chunk in (b"ab", b"cde"))
+
+    @app.route("/large")
+    def large():
+        response.text = "osa " * 1000
+
+    client.get(abs_url("/stream"), headers={"Accept-Encoding": "identity"})
+    res = client.get(abs_url("/large"), headers={"Accept-Encoding": "gzip"})
+    logger.close()
+
+    streamed_record, large_record = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert streamed_record["bytes"] == 5
+    assert large_record["bytes"] == len(res.content) < 4000
+
+
+def test_access_log_sampling(app, client):
+    stream = io.StringIO()
+    logger = AccessLogger(app, stream=stream, sample_rate=0.0)
+    client.get(abs_url("/"))
+    logger.close()
+    assert stream.getvalue() == ""
+
+
+class BlockingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.writing.set()
+        self.release.wait(5)
+        return super().write(data)
+
+
+def test_access_log_drops_when_full():
+    stream = BlockingStream()
+    logger = AccessLogger(stream=stream, queue_size=1)
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/"}
+    logger.log(environ, 200, 0, 0.001)
+    assert stream.writing.wait(5)  # the writer holds the first record
+    logger.log(environ, 200, 0, 0.001)  # fills the queue
+    logger.log(environ, 200, 0, 0.001)  # dropped, the request thread does not wait
+    assert logger.dropped == 1
+    stream.release.set()
+    logger.close()
+    assert len(stream.getvalue().splitlines()) == 2
@@ -0,0 +1,110 @@
+import threading
+import time
+import pytest
+from osa.admission import AdmissionController, RateLimiter, TokenBucket
+from osa.globals import response
+from osa.testing import build_environ
+from .utils import abs_url
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(rate=1, capacity=2, now=0)
+    assert bucket.consume(0) == 0
+    assert bucket.consume(0) == 0
+    assert bucket.consume(0) == 1
+    assert bucket.consume(1) == 0
+
+
+def test_admission_sheds_when_full(app, client):
+    @app.route("/slow")
+    def slow():
+        response.text = "done"
+
+    admission = AdmissionController(app, max_in_flight=1, retry_after=5)
+    assert admission.acquire()
+    res = client.get(abs_url("/slow"))
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "5"
+    assert admission.rejected == 1
+
+    admission.release()
+    res = client.get(abs_url("/slow"))
+    assert res.status_code == 200
+    assert admission.in_flight == 0
+
+
+def test_admission_slot_is_held_until_the_body_is_sent(app):
+    admission = AdmissionController(app, max_in_flight=1)
+
+    @app.route("/stream")
+    def stream():
+        response.app_iter = (chunk for chunk in (b"a", b"b"))
+
+    result = app(build_environ("GET", "/stream"), lambda status, headers, exc_info=None: None)
+    assert next(iter(result)) == b"a"
+    assert admission.in_flight == 1
+    assert app(build_environ("GET", "/stream"), lambda status, headers, exc_info=None: None) == [admission._body]
+    result.close()
+    assert admission.in_flight == 0
+
+
+def test_admission_slot_is_released_on_error(app, monkeypatch):
+    admission = AdmissionController(app, max_in_flight=1)
+
+    def fail(environ, start_response):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app, "handle_request", fail)
+    with pytest.raises(RuntimeError):
+        app(build_environ("GET", "/"), None)
+    assert admission.in_flight == 0
+
+
+def test_admission_queue_waits_for_a_slot():
+    admission = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=2)
+    assert admission.acquire()
+    timer = threading.Timer(0.05, admission.release)
+    timer.start()
+    start = time.monotonic()
+    assert admission.acquire()
+    assert time.monotonic() - start < 2
+    admission.release()
+
+
+def test_admission_queue_deadline():
+    admission = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.01)
+    assert admission.acquire()
+    assert not admission.acquire()
+    assert admission.waiting == 0
+
+
+def test_rate_limit_per_client(app, client):
+    limiter = RateLimiter(rate=1, burst=2)
+    app.before_request(limiter.check)
+
+    @app.route("/limited")
+    def limited():
+        response.text = "ok"
+
+    assert client.get(abs_url("/limited")).status_code == 200
+    assert client.get(abs_url("/limited")).status_code == 200
+    res = client.get(abs_url("/limited"))
+    assert res.status_code == 429
+    assert res.headers["Retry-After"] == "1"
+
+
+def test_rate_limit_per_route(app, client):
+    limiter = RateLimiter(rate=1, burst=1)
+
+    @app.route("/once")
+    @limiter.limit
+    def once():
+        response.text = "ok"
+
+    @app.route("/free")
+    def free():
+        response.text = "ok"
+
+    assert client.get(abs_url("/once")).status_code == 200
+    assert client.get(abs_url("/once")).status_code == 429
+    assert client.get(abs_url("/free")).status_code == 200
@@ -1,3 +1,5 @@
+import subprocess
+import sys
 import pytest
 from osa.globals import response
 from .utils import abs_url
@@ -69,4 +71,15 @@ def test_class_based_handler_method_not_allowed(app, client):
             response.text = "POST"
 
     res = client.get(abs_url("/test_class"))
-    assert res.status_code == 405
\ No newline at end of file
+    assert res.status_code == 405
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys, osa, osa.cli\n"
+        "heavy = {'requests', 'jinja2', 'webob', 'osa.app'} & set(sys.modules)\n"
+        "assert not heavy, heavy\n"
+        "app = osa.Osa()\n"
+        "assert not {'jinja2', 'requests', 'sqlite3'} & set(sys.modules)\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
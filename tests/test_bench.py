@@ -0,0 +1,67 @@
+import json
+import textwrap
+import pytest
+from click.testing import CliRunner
+from osa import bench
+from osa.cli import cli
+from osa.globals import response
+
+
+def test_parse_url_spec():
+    assert bench.parse_url_spec("/") == ("GET", "/", 1)
+    assert bench.parse_url_spec("post /items 3") == ("POST", "/items", 3)
+    assert bench.parse_url_spec("/search?q=a 5") == ("GET", "/search?q=a", 5)
+    with pytest.raises(ValueError):
+        bench.parse_url_spec("GET items")
+
+
+def test_percentile():
+    values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert bench.percentile(values, 50) == 5
+    assert bench.percentile(values, 90) == 9
+    assert bench.percentile(values, 99) == 10
+    assert bench.percentile([], 50) == 0.0
+
+
+def test_in_process_run(app):
+    @app.route("/ok")
+    def ok():
+        response.text = "ok"
+
+    @app.route("/boom")
+    def boom():
+        raise ValueError("boom")
+
+    mix = [("GET", "/ok", 1), ("GET", "/boom", 1)]
+    stats, elapsed = bench.run(bench.wsgi_sender(app), mix, concurrency=2, duration=0.2)
+    summary = bench.summarize(stats, elapsed)
+    assert summary["routes"]["GET /ok"]["errors"] == 0
+    assert summary["routes"]["GET /boom"]["errors"] == summary["routes"]["GET /boom"]["requests"]
+    assert summary["total"]["requests"] > 0
+
+
+def test_in_process_run_groups_by_route(app):
+    @app.route("/items/{item_id}")
+    def item(item_id):
+        response.text = item_id
+
+    mix = [("GET", "/items/1", 1), ("GET", "/items/2", 1), ("GET", "/missing", 1)]
+    stats, elapsed = bench.run(bench.wsgi_sender(app), mix, duration=0.2)
+    assert set(bench.summarize(stats, elapsed)["routes"]) == {"GET /items/{item_id}", "GET /missing"}
+
+
+def test_bench_command_json(tmp_path, monkeypatch):
+    (tmp_path / "app.py").write_text(textwrap.dedent("""
+        from osa import Osa, response
+        app = Osa(debug=False)
+
+        @app.route("/")
+        def index():
+            response.text = "hi"
+    """))
+    monkeypatch.chdir(tmp_path)
+    result = CliRunner().invoke(cli, ["bench", "--duration", "0.2", "--json", "--url", "/ 2", "--url", "/missing"])
+    assert result.exit_code == 0, result.output
+    report = json.loads(result.output)
+    assert set(report["routes"]) == {"GET /", "GET /missing"}
+    assert report["routes"]["GET /"]["requests"] > 0
@@ -0,0 +1,15 @@
+from benchmarks.__main__ import compare
+from benchmarks.scenarios import SCENARIOS
+
+
+def test_compare_flags_regressions():
+    baseline = {"fast": {"ns_per_op": 100.0}, "slow": {"ns_per_op": 100.0}, "gone": {"ns_per_op": 1.0}}
+    current = {"fast": {"ns_per_op": 110.0}, "slow": {"ns_per_op": 200.0}, "new": {"ns_per_op": 5.0}}
+    rows = {name: regressed for name, _, _, _, regressed in compare(baseline, current, threshold=0.25)}
+    assert rows == {"fast": False, "slow": True}
+
+
+def test_scenarios_run():
+    for name, setup in SCENARIOS.items():
+        if name != "router_match_1000":
+            setup()()
@@ -0,0 +1,113 @@
+import os
+import time
+import pytest
+from osa.cache import MemoryCache, SharedMemoryCache
+from osa.sessions import CacheSessionStore
+from osa.static_file_handler import StaticFileHandler
+from osa.testing import build_environ
+from webob import Request
+
+
+@pytest.fixture(params=[MemoryCache, SharedMemoryCache])
+def cache(request):
+    return request.param()
+
+
+def test_get_set_delete(cache):
+    assert cache.get("missing") is None
+    assert cache.get("missing", 1) == 1
+    assert cache.set("page", {"html": "<p>osa</p>", "n": [1, 2]})
+    assert cache.get("page") == {"html": "<p>osa</p>", "n": [1, 2]}
+    assert cache.set("page", "updated")
+    assert cache.get("page") == "updated"
+    assert len(cache) == 1
+    assert cache.delete("page")
+    assert not cache.delete("page")
+    cache.set("a", 1)
+    cache.clear()
+    assert cache.get("a") is None
+
+
+def test_ttl(cache):
+    cache.set("short", 1, ttl=0.05)
+    cache.set("long", 2, ttl=60)
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+
+
+def test_shared_memory_eviction_is_lru_per_set():
+    cache = SharedMemoryCache(slots=4, ways=4)
+    for i in range(4):
+        cache.set(f"k{i}", i)
+        time.sleep(0.001)
+    cache.get("k0")  # k1 is now the least recently used
+    cache.set("k4", 4)
+    assert cache.get("k1") is None
+    assert [cache.get(k) for k in ("k0", "k2", "k3", "k4")] == [0, 2, 3, 4]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_shared_memory_rejects_large_values():
+    cache = SharedMemoryCache(slots=8, slot_size=256)
+    assert not cache.set("big", b"x" * 1000)
+    assert cache.get("big") is None
+    # A value that outgrows its slot does not leave the previous one behind
+    cache.set("k", "small")
+    assert not cache.set("k", b"x" * 1000)
+    assert cache.get("k") is None
+    with pytest.raises(ValueError):
+        SharedMemoryCache(slot_size=16)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork()")
+def test_shared_memory_is_shared_with_forked_workers():
+    cache = SharedMemoryCache(slots=64)
+    cache.set("from-master", "warm")
+    pid = os.fork()
+    if pid == 0:
+        ok = cache.get("from-master") == "warm" and cache.set("from-worker", os.getpid())
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert cache.get("from-worker") == pid
+
+
+def test_static_handler_with_shared_cache(tmp_path):
+    (tmp_path / "app.css").write_text("body { color: red; }")
+    cache = SharedMemoryCache(slots=16)
+    handler = StaticFileHandler(str(tmp_path), cache=cache, compress_enabled=False)
+    first = handler.serve("app.css", Request(build_environ("GET", "/static/app.css")))
+    # Another worker, same shared cache: served without reading the file
+    (tmp_path / "app.css").write_text("changed")
+    other = StaticFileHandler(str(tmp_path), cache=cache, compress_enabled=False)
+    second = other.serve("app.css", Request(build_environ("GET", "/static/app.css")))
+    assert second.body == first.body == b"body { color: red; }"
+    assert second.headers["ETag"] == first.headers["ETag"]
+    etag = first.headers["ETag"]
+    not_modified = other.serve("app.css", Request(build_environ("GET", "/static/app.css", {"If-None-Match": etag})))
+    assert not_modified.status_code == 304
+
+
+def test_cache_session_store(app, client):
+    from osa import session
+    from osa.globals import response
+    CacheSessionStore(app, cache=SharedMemoryCache(slots=64))
+
+    @app.route("/count")
+    def count():
+        session["n"] = session.get("n", 0) + 1
+        response.text = str(session["n"])
+
+    assert client.get("/count").text == "1"
+    assert client.get("/count").text == "2"
+    with pytest.raises(ValueError):
+        CacheSessionStore()
+
+
+def test_cache_session_store_too_large():
+    store = CacheSessionStore(cache=SharedMemoryCache(slots=8, slot_size=256))
+    store.store("sid", {"n": 1})
+    with pytest.raises(ValueError):
+        store.store("sid", {"blob": "x" * 1000})
+    assert store.load("sid") is None
@@ -0,0 +1,88 @@
+import gzip
+import json
+import zlib
+import pytest
+from osa.compression import Compression, parse_accept_encoding
+from osa.globals import response
+
+BIG = "osa " * 500
+
+
+@pytest.fixture
+def compressed_app(app):
+    Compression(app, min_size=100)
+
+    @app.route("/page")
+    def page():
+        response.text = BIG
+
+    @app.route("/tiny")
+    def tiny():
+        response.text = "hi"
+
+    @app.route("/image")
+    def image():
+        response.content_type = "image/png"
+        response.body = b"\x89PNG" * 500
+
+    @app.route("/stream")
+    def stream():
+        response.content_type = "application/json"
+        response.app_iter = (json.dumps({"n": i}).encode() + b"\n" for i in range(200))
+
+    return app
+
+
+def test_negotiation():
+    compression = Compression()
+    assert parse_accept_encoding("gzip;q=0.5, br, deflate") == {"gzip": 0.5, "br": 1.0, "deflate": 1.0}
+    assert compression.negotiate("gzip, deflate, br") == "gzip"
+    assert compression.negotiate("gzip;q=0.5, deflate") == "deflate"
+    assert compression.negotiate("gzip;q=0, identity") is None
+    assert compression.negotiate("*") == "gzip"
+    assert compression.negotiate("br") is None
+    assert compression.negotiate(None) is None
+
+
+def test_gzip_and_deflate(compressed_app, client):
+    res = client.get("/page", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert res.headers["Vary"] == "Accept-Encoding"
+    assert int(res.headers["Content-Length"]) == len(res.content) < len(BIG)
+    assert gzip.decompress(res.content).decode() == BIG
+
+    res = client.get("/page", headers={"Accept-Encoding": "deflate"})
+    assert zlib.decompress(res.content).decode() == BIG
+
+
+def test_skipped_responses(compressed_app, client):
+    res = client.get("/page")
+    assert "Content-Encoding" not in res.headers
+    assert res.headers["Vary"] == "Accept-Encoding"
+    assert res.text == BIG
+    assert "Content-Encoding" not in client.get("/tiny", headers={"Accept-Encoding": "gzip"}).headers
+    image = client.get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in image.headers and "Vary" not in image.headers
+    assert client.head("/page", headers={"Accept-Encoding": "gzip"}).content == b""
+
+
+def test_streamed_body_is_compressed_incrementally(compressed_app, client):
+    res = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in res.headers
+    lines = gzip.decompress(res.content).decode().splitlines()
+    assert [json.loads(line)["n"] for line in lines] == list(range(200))
+
+    compression = Compression()
+    chunks = list(compression._stream(iter([b"a" * 1000, b"b" * 1000]), "gzip"))
+    # Every chunk is flushed as soon as it is compressed
+    assert len(chunks) == 3
+    assert gzip.decompress(b"".join(chunks)) == b"a" * 1000 + b"b" * 1000
+
+
+def test_compress_one_shot():
+    compression = Compression()
+    first = compression.compress(b"first " * 100, "gzip")
+    second = compression.compress(b"second " * 100, "gzip")
+    assert gzip.decompress(first) == b"first " * 100
+    assert gzip.decompress(second) == b"second " * 100
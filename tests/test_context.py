@@ -20,3 +20,68 @@ def test_response_context():
 
     response.text = "Hello"
     assert response.text == "Hello"
+
+
+def test_recycled_request_context():
+    from osa.ctx import RequestContext
+    first = RequestContext.acquire({"PATH_INFO": "/a", "REQUEST_METHOD": "GET", "HTTP_X_NAME": "a"})
+    first.push()
+    assert request.headers["X-Name"] == "a"
+    old_request = first.request
+    first.pop()
+    first.release()
+
+    second = RequestContext.acquire({"PATH_INFO": "/b", "REQUEST_METHOD": "POST", "HTTP_X_NAME": "b"})
+    assert second is first
+    # The request of a finished context is left as it was, a response body may still use it
+    assert second.request is not old_request
+    assert old_request.headers["X-Name"] == "a"
+    second.push()
+    # Nothing of the previous request is left, cached headers included
+    assert request.path == "/b" and request.method == "POST"
+    assert request.headers["X-Name"] == "b"
+    second.pop()
+    second.release()
+
+
+def test_nested_contexts_restore_the_outer_one():
+    from osa.ctx import RequestContext, ResponseContext
+    before = _request_ctx_var.get()
+    outer = RequestContext.acquire({"PATH_INFO": "/outer", "REQUEST_METHOD": "GET"})
+    outer.push()
+    outer_res = ResponseContext.acquire()
+    outer_res.push()
+    inner = RequestContext.acquire({"PATH_INFO": "/inner", "REQUEST_METHOD": "GET"})
+    inner.push()
+    inner_res = ResponseContext.acquire()
+    inner_res.push()
+    assert request.path == "/inner"
+    assert inner_res.response is not outer_res.response
+    inner_res.pop()
+    inner.pop()
+    assert request.path == "/outer"
+    assert response._get_current_object() is outer_res.response
+    outer_res.pop()
+    outer.pop()
+    assert _request_ctx_var.get() is before
+
+
+def test_contexts_are_per_thread():
+    from osa.ctx import RequestContext
+    ctx = RequestContext.acquire({"PATH_INFO": "/", "REQUEST_METHOD": "GET"})
+    ctx.release()
+    other = []
+    thread = threading.Thread(target=lambda: other.append(RequestContext.acquire({"PATH_INFO": "/t"})))
+    thread.start()
+    thread.join()
+    assert other[0] is not ctx
+
+
+def test_streamed_body_can_use_the_request(app, client):
+    @app.route("/stream")
+    def stream():
+        req = request._get_current_object()
+        response.app_iter = (f"q={req.GET.get('q')}".encode() for _ in range(1))
+
+    assert client.get("/stream?q=hello").text == "q=hello"
+    assert client.get("/stream?q=again").text == "q=again"
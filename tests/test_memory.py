@@ -0,0 +1,62 @@
+import tracemalloc
+import pytest
+from osa.globals import response
+from osa.memory import MemoryProfiler, format_size
+
+leaked = []
+
+
+@pytest.fixture
+def memory_app(app):
+    profiler = MemoryProfiler(app, token="secret")
+
+    @app.route("/leak")
+    def leak():
+        leaked.append(bytearray(200_000))
+        response.text = "ok"
+
+    @app.route("/temporary")
+    def temporary():
+        data = bytearray(500_000)
+        response.text = str(len(data))
+
+    @app.route("/small")
+    def small():
+        response.text = "ok"
+
+    yield app
+    profiler.stop()
+    leaked.clear()
+
+
+def test_memory_per_route(memory_app, client):
+    for _ in range(3):
+        client.get("/leak")
+        client.get("/temporary")
+        client.get("/small")
+    routes = dict(memory_app.memory.top_routes())
+    assert routes["/leak"].requests == 3
+    assert routes["/leak"].net >= 3 * 200_000
+    if hasattr(tracemalloc, "reset_peak"):
+        assert routes["/temporary"].max_peak >= 500_000
+    assert routes["/temporary"].max_net < 200_000
+    assert memory_app.memory.top_routes()[0][0] == "/leak"
+
+
+def test_memory_admin_report_and_diff(memory_app, client):
+    assert client.get("/_osa/memory").status_code == 403
+    headers = {"X-Osa-Memory-Token": "secret"}
+    first = int(client.get("/_osa/memory?action=snapshot", headers=headers).text)
+    for _ in range(5):
+        client.get("/leak")
+    report = client.get("/_osa/memory", headers=headers).text
+    assert "/leak" in report and "top code sites:" in report
+    diff = client.get(f"/_osa/memory?action=diff&from={first}", headers=headers).text
+    assert "test_memory.py" in diff.splitlines()[0]
+    assert client.get("/_osa/memory?action=diff&from=999", headers=headers).status_code == 400
+
+
+def test_format_size():
+    assert format_size(512) == "512 B"
+    assert format_size(2048) == "2.0 KiB"
+    assert format_size(-3 * 1024 * 1024) == "-3.0 MiB"
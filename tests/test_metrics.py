@@ -0,0 +1,76 @@
+import time
+from osa.globals import response
+from osa.metrics import Metrics, PhaseTimings
+from .utils import abs_url
+
+
+def test_phase_timings_header():
+    timings = PhaseTimings()
+    timings.phases["handler"] = 0.0015
+    assert timings.header(0.002) == "handler;dur=1.500, total;dur=2.000"
+
+
+def test_server_timing_header(app, client):
+    Metrics(app, server_timing=True)
+
+    @app.route("/page")
+    def page():
+        response.text = app.template("test.html", {"name": "World"})
+
+    res = client.get(abs_url("/page"))
+    phases = [item.split(";")[0] for item in res.headers["Server-Timing"].split(", ")]
+    assert phases == ["before_request", "routing", "template", "handler", "after_request", "total"]
+
+
+def test_template_time_is_not_counted_in_handler(app, client):
+    metrics = Metrics(app)
+    slow_render = app.templates_env.env.get_template("test.html").render
+
+    def render(**context):
+        time.sleep(0.05)
+        return slow_render(**context)
+
+    app.templates_env.env.get_template("test.html").render = render
+
+    @app.route("/page")
+    def page():
+        response.text = app.template("test.html", {"name": "World"})
+
+    client.get(abs_url("/page"))
+    assert metrics.phases[("/page", "template")][0] >= 0.05
+    assert metrics.phases[("/page", "handler")][0] < 0.05
+
+
+def test_no_server_timing_by_default(app, client):
+    Metrics(app)
+
+    @app.route("/plain")
+    def plain():
+        response.text = "ok"
+
+    assert "Server-Timing" not in client.get(abs_url("/plain")).headers
+
+
+def test_metrics_endpoint(app, client):
+    Metrics(app)
+
+    @app.route("/items/{item_id}")
+    def item(item_id):
+        response.text = item_id
+
+    @app.route("/boom")
+    def boom():
+        raise ValueError("boom")
+
+    client.get(abs_url("/items/1"))
+    client.get(abs_url("/items/2"))
+    client.get(abs_url("/boom"))
+    client.get(abs_url("/missing"))
+    res = client.get(abs_url("/metrics"))
+    assert res.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = res.text
+    assert 'osa_requests_total{route="/items/{item_id}",method="GET",status="200"} 2' in text
+    assert 'osa_requests_total{route="<unmatched>",method="GET",status="404"} 1' in text
+    assert 'osa_request_errors_total{route="/boom"} 1' in text
+    assert 'osa_request_duration_seconds_bucket{route="/items/{item_id}",method="GET",le="+Inf"} 2' in text
+    assert 'osa_request_phase_seconds_count{route="/items/{item_id}",phase="handler"} 2' in text
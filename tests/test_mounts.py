@@ -0,0 +1,140 @@
+import pytest
+import osa
+from osa.globals import request, response
+from osa.metrics import Metrics
+from osa.mounts import PrefixTrie, mount_environ
+from osa.static_file_handler import StaticFileHandler
+
+
+def test_prefix_trie():
+    trie = PrefixTrie()
+    trie.insert("/api", "api")
+    trie.insert("/api/v2/", "v2")
+    trie.insert("static", "static")
+    assert len(trie) == 3
+    assert trie.lookup("/api") == ("/api", "api")
+    assert trie.lookup("/api/users/1") == ("/api", "api")
+    assert trie.lookup("/api/v2/users") == ("/api/v2", "v2")
+    assert trie.lookup("/static/css/style.css") == ("/static", "static")
+    assert trie.lookup("/apidocs") is None
+    assert trie.lookup("/") is None
+    with pytest.raises(ValueError):
+        trie.insert("/", "root")
+    assert trie.remove("/api/v2")
+    assert not trie.remove("/api/v2")
+    assert trie.lookup("/api/v2/users") == ("/api", "api")
+    assert len(trie) == 2
+
+
+def test_mount_environ():
+    environ = {"SCRIPT_NAME": "/root", "PATH_INFO": "/api//users/1", "osa.route": "/x"}
+    mounted = mount_environ(environ, "/api")
+    assert mounted["SCRIPT_NAME"] == "/root/api"
+    assert mounted["PATH_INFO"] == "//users/1"
+    assert "osa.route" not in mounted
+    assert environ["PATH_INFO"] == "/api//users/1"
+    assert mount_environ({"PATH_INFO": "/api"}, "/api")["PATH_INFO"] == ""
+
+
+@pytest.fixture
+def api():
+    api = osa.Osa(debug=False)
+    calls = []
+
+    @api.before_request
+    def before():
+        calls.append("api")
+
+    @api.route("/")
+    def index():
+        response.text = "api index"
+
+    @api.route("/users/{user_id}")
+    def user(user_id):
+        response.text = f"{request.script_name} {request.path_info} {user_id}"
+
+    @api.errorhandler(404)
+    def not_found():
+        response.text = "api: no such resource"
+
+    api.calls = calls
+    return api
+
+
+def test_mount_osa_app(app, client, api):
+    parent_calls = []
+
+    @app.before_request
+    def before():
+        parent_calls.append("parent")
+
+    @app.route("/users/{user_id}")
+    def user(user_id):
+        response.text = "parent user"
+
+    app.mount("/api", api)
+    assert client.get("/api/users/7").text == "/api /users/7 7"
+    assert client.get("/api").text == "api index"
+    assert client.get("/users/7").text == "parent user"
+    res = client.get("/api/missing")
+    assert res.status_code == 404
+    assert res.text == "api: no such resource"
+    # Each app runs its own hooks only
+    assert api.calls == ["api", "api", "api"]
+    assert parent_calls == ["parent"]
+
+
+def test_mount_wsgi_app(app, client):
+    def wsgi_app(environ, start_response):
+        body = f"{environ['SCRIPT_NAME']}|{environ['PATH_INFO']}".encode()
+        start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))])
+        return [body]
+
+    app.mount("/legacy", wsgi_app)
+    assert client.get("/legacy/a/b?x=1").text == "/legacy|/a/b"
+
+
+def test_static_is_a_mount(tmp_path, client):
+    static_dir = tmp_path / "static"
+    static_dir.mkdir()
+    (static_dir / "style.css").write_text("body {}")
+    media_dir = tmp_path / "media"
+    media_dir.mkdir()
+    (media_dir / "logo.svg").write_text("<svg/>")
+    app = osa.Osa(static_dir=str(static_dir), debug=False)
+    app.mount("/media", StaticFileHandler(str(media_dir)))
+
+    @app.errorhandler(404)
+    def not_found():
+        response.text = "custom 404"
+
+    client = app.test_client()
+    identity = {"Accept-Encoding": "identity"}
+    assert client.get("/static/style.css", headers=identity).content == b"body {}"
+    missing = client.get("/static/missing.css")
+    assert missing.status_code == 404
+    assert missing.text == "custom 404"
+    assert client.get("/media/logo.svg", headers=identity).content == b"<svg/>"
+    assert client.get("/media/nope.svg").status_code == 404
+
+
+def test_static_root_can_be_changed(tmp_path):
+    (tmp_path / "style.css").write_text("body {}")
+    app = osa.Osa(static_dir=str(tmp_path), debug=False)
+    app._static_root = "/assets"
+
+    @app.route("/check")
+    def check():
+        response.text = str(app.is_static_file())
+
+    client = app.test_client()
+    assert client.get("/assets/style.css", headers={"Accept-Encoding": "identity"}).content == b"body {}"
+    assert client.get("/static/style.css").status_code == 404
+    assert client.get("/check").text == "False"
+
+
+def test_mounted_routes_in_metrics(app, client, api):
+    metrics = Metrics(app)
+    app.mount("/api", api)
+    client.get("/api/users/1")
+    assert ("/api/users/{user_id}", "GET", 200) in metrics.requests
@@ -0,0 +1,87 @@
+import os
+import signal
+import threading
+import time
+import pytest
+from osa.globals import response
+from osa.profiler import RequestProfiler, SamplingProfiler
+from .utils import abs_url
+
+
+@pytest.fixture
+def slow_app(app):
+    @app.route("/slow")
+    def slow():
+        time.sleep(0.1)
+        response.text = "done"
+    return app
+
+
+def test_request_profiler_needs_token(app):
+    with pytest.raises(ValueError):
+        RequestProfiler(app)
+
+
+def test_request_profiler_report(slow_app, client):
+    RequestProfiler(slow_app, token="secret")
+    assert client.get(abs_url("/slow")).text == "done"
+    assert client.get(abs_url("/slow"), headers={"X-Osa-Profile": "wrong"}).text == "done"
+
+    res = client.get(abs_url("/slow"), headers={"X-Osa-Profile": "secret"})
+    assert res.text.startswith("Profile of GET /slow -> 200 OK")
+    assert "function calls" in res.text
+    assert "Profile of" in client.get(abs_url("/slow?__profile=secret")).text
+
+
+def test_request_profiler_output_dir(slow_app, client, tmp_path):
+    RequestProfiler(slow_app, token="secret", output_dir=str(tmp_path))
+    res = client.get(abs_url("/slow"), headers={"X-Osa-Profile": "secret"})
+    assert res.text == "done"
+    assert res.headers["X-Osa-Profile-File"].endswith("-slow.prof")
+    assert len(list(tmp_path.glob("*.prof"))) == 1
+
+
+def test_sampling_profiler(slow_app, client, tmp_path):
+    sampler = SamplingProfiler(slow_app, interval=0.005, output_dir=str(tmp_path), signal_number=None)
+    sampler.start()
+    threads = [threading.Thread(target=client.get, args=(abs_url("/slow"),)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    path = sampler.stop()
+    assert not sampler.in_flight
+    lines = open(path).read().splitlines()
+    assert lines
+    assert all(line.startswith("/slow;") for line in lines)
+    assert any("slow (" in line for line in lines)
+
+
+def test_sampling_profiler_admin(app, client, tmp_path):
+    sampler = SamplingProfiler(app, output_dir=str(tmp_path), token="secret", signal_number=None)
+    url = abs_url("/_osa/profiler")
+    assert client.get(url + "?action=start").status_code == 403
+    assert client.post(url + "?action=start", headers={"X-Osa-Profile-Token": "secret"}).status_code == 200
+    assert sampler.running
+    res = client.post(url + "?action=stop&token=secret")
+    assert "wrote" in res.text
+    assert not sampler.running
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGUSR2"), reason="needs SIGUSR2")
+def test_sampling_profiler_signal(app, tmp_path):
+    previous = signal.getsignal(signal.SIGUSR2)
+    try:
+        sampler = SamplingProfiler(app, interval=0.005, output_dir=str(tmp_path))
+        os.kill(os.getpid(), signal.SIGUSR2)
+        deadline = time.monotonic() + 5
+        while not sampler.running and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sampler.running
+        os.kill(os.getpid(), signal.SIGUSR2)
+        while not list(tmp_path.iterdir()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not sampler.running
+        assert len(list(tmp_path.iterdir())) == 1
+    finally:
+        signal.signal(signal.SIGUSR2, previous)
@@ -0,0 +1,113 @@
+import http.client
+import socket
+import threading
+import pytest
+from osa.globals import request, response
+from osa.selector_server import BadRequest, ChunkedDecoder, SelectorServer, parse_chunked
+from osa.server import create_socket
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(app, **kwargs):
+        sock = create_socket("127.0.0.1", 0)
+        server = SelectorServer(app, sock, threads=2, poll_interval=0.05, **kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        servers.append((server, thread))
+        return sock.getsockname()[1]
+
+    yield start
+    for server, thread in servers:
+        server.stop()
+        thread.join(5)
+
+
+def read_all(sock):
+    data = b""
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return data
+        data += chunk
+
+
+def test_parse_chunked():
+    buf = bytearray(b"XX3\r\nabc\r\n2;ext=1\r\nde\r\n0\r\n\r\nrest")
+    assert parse_chunked(buf, 2) == (b"abcde", len(buf) - 4)
+    assert parse_chunked(bytearray(b"3\r\nab"), 0) is None
+    with pytest.raises(BadRequest):
+        parse_chunked(bytearray(b"3" * 10000), 0)
+
+
+def test_chunked_decoder_only_parses_new_bytes():
+    data = b"".join(b"4\r\n%04d\r\n" % i for i in range(1000)) + b"0\r\n\r\n"
+    decoder = ChunkedDecoder(0)
+    buf = bytearray()
+    for i in range(0, len(data), 7):
+        done = decoder.feed(buf)
+        assert done is None
+        # Everything before pos is decoded already and never looked at again
+        assert len(decoder.body) == decoder.pos // 9 * 4
+        buf += data[i:i + 7]
+    assert decoder.feed(buf) == (b"".join(b"%04d" % i for i in range(1000)), len(data))
+
+
+def test_keep_alive_reuses_connection(app, serve):
+    @app.route("/peer")
+    def peer():
+        response.text = request.environ["REMOTE_PORT"]
+
+    conn = http.client.HTTPConnection("127.0.0.1", serve(app))
+    ports = set()
+    for _ in range(3):
+        conn.request("GET", "/peer")
+        res = conn.getresponse()
+        assert res.status == 200
+        ports.add(res.read())
+    assert len(ports) == 1
+    conn.close()
+
+
+def test_pipelining_and_chunked_request(app, serve):
+    @app.route("/echo", methods=["POST"])
+    def echo():
+        response.text = request.body.decode()
+
+    sock = socket.create_connection(("127.0.0.1", serve(app)))
+    sock.sendall(
+        b"POST /echo HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\n"
+        b"3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n"
+        b"POST /echo HTTP/1.1\r\nHost: x\r\nContent-Length: 2\r\nConnection: close\r\n\r\nfg"
+    )
+    data = read_all(sock)
+    assert data.count(b"HTTP/1.1 200 OK") == 2
+    assert data.index(b"abcde") < data.index(b"fg")
+    assert data.endswith(b"fg")
+
+
+def test_streaming_response_is_chunked(serve):
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        yield b"hello "
+        yield b"world"
+
+    conn = http.client.HTTPConnection("127.0.0.1", serve(app))
+    conn.request("GET", "/")
+    res = conn.getresponse()
+    assert res.getheader("Transfer-Encoding") == "chunked"
+    assert res.read() == b"hello world"
+
+
+def test_idle_connection_is_closed(app, serve):
+    sock = socket.create_connection(("127.0.0.1", serve(app, idle_timeout=0.1)))
+    sock.settimeout(5)
+    assert sock.recv(10) == b""
+
+
+def test_bad_request(app, serve):
+    sock = socket.create_connection(("127.0.0.1", serve(app)))
+    sock.sendall(b"NONSENSE\r\n\r\n")
+    assert read_all(sock).startswith(b"HTTP/1.1 400 Bad Request")
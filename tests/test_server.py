@@ -0,0 +1,162 @@
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+import urllib.request
+import pytest
+from osa.globals import response
+from osa.server import WSGIWorker, create_socket
+
+
+def wait_for(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return urllib.request.urlopen(url, timeout=1).read()
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def test_threaded_worker_serves_requests(app):
+    @app.route("/pid")
+    def pid():
+        response.text = str(os.getpid())
+
+    sock = create_socket("127.0.0.1", 0)
+    port = sock.getsockname()[1]
+    worker = WSGIWorker(app, sock, threads=4, poll_interval=0.05)
+    thread = threading.Thread(target=worker.serve_forever)
+    thread.start()
+    try:
+        for _ in range(5):
+            assert wait_for(f"http://127.0.0.1:{port}/pid") == str(os.getpid()).encode()
+    finally:
+        worker.stop()
+        thread.join(5)
+        worker.server_close()
+    assert not thread.is_alive()
+
+
+
+def test_busy_worker_does_not_accept(app):
+    from osa import Osa
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    @app.route("/slow")
+    def slow():
+        started.release()
+        release.wait(10)
+        response.text = "a"
+
+    other = Osa(debug=False)
+
+    @other.route("/slow")
+    def fast():
+        response.text = "b"
+
+    sock = create_socket("127.0.0.1", 0)
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}/slow"
+    busy = WSGIWorker(app, sock, threads=2, poll_interval=0.05)
+    idle = WSGIWorker(other, sock, threads=2, poll_interval=0.05)
+    threads = [threading.Thread(target=busy.serve_forever)]
+    threads[0].start()
+    clients = [threading.Thread(target=wait_for, args=(url,)) for _ in range(2)]
+    try:
+        for client in clients:
+            client.start()
+        assert started.acquire(timeout=5) and started.acquire(timeout=5)
+        threads.append(threading.Thread(target=idle.serve_forever))
+        # Both threads of the first worker are busy: it must leave the next connection in the
+        # backlog for the second worker, started a bit later, instead of queueing it
+        timer = threading.Timer(0.3, threads[1].start)
+        timer.start()
+        assert urllib.request.urlopen(url, timeout=2).read() == b"b"
+        timer.join()
+    finally:
+        release.set()
+        for client in clients:
+            client.join(5)
+        for worker, thread in zip((busy, idle), threads):
+            worker.stop()
+            if thread.is_alive():
+                thread.join(5)
+        sock.close()
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="pre-fork needs os.fork")
+def test_prefork_restarts_workers_and_drains(tmp_path):
+    script = tmp_path / "serve.py"
+    script.write_text(textwrap.dedent("""
+        import os, sys
+        from osa import Osa, response
+        from osa.server import PreforkServer
+
+        app = Osa(debug=False)
+
+        @app.route("/pid")
+        def pid():
+            response.text = str(os.getpid())
+
+        server = PreforkServer(app, "127.0.0.1", int(sys.argv[1]), workers=2)
+        server.run()
+    """))
+    sock = create_socket("127.0.0.1", 0)
+    port = sock.getsockname()[1]
+    sock.close()
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen([sys.executable, str(script), str(port)], cwd=cwd,
+                            env=dict(os.environ, PYTHONPATH=cwd))
+    try:
+        url = f"http://127.0.0.1:{port}/pid"
+        worker_pid = int(wait_for(url))
+        assert worker_pid != proc.pid
+        os.kill(worker_pid, signal.SIGKILL)
+        # The arbiter replaces the crashed worker and keeps serving
+        deadline = time.monotonic() + 10
+        while int(wait_for(url)) == worker_pid and time.monotonic() < deadline:
+            pass
+        assert int(wait_for(url)) != worker_pid
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(15) == 0
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="pre-fork needs os.fork")
+def test_prefork_worker_flushes_access_log(tmp_path):
+    script = tmp_path / "serve.py"
+    log_path = tmp_path / "access.log"
+    script.write_text(textwrap.dedent("""
+        import sys
+        from osa import Osa, response
+        from osa.access_log import AccessLogger
+        from osa.server import PreforkServer
+
+        app = Osa(debug=False)
+        # Records stay queued until the worker stops
+        AccessLogger(app, path=sys.argv[2], flush_interval=60, batch_size=10000)
+
+        @app.route("/hello")
+        def hello():
+            response.text = "hello"
+
+        server = PreforkServer(app, "127.0.0.1", int(sys.argv[1]), workers=1)
+        server.run()
+    """))
+    sock = create_socket("127.0.0.1", 0)
+    port = sock.getsockname()[1]
+    sock.close()
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen([sys.executable, str(script), str(port), str(log_path)], cwd=cwd,
+                            env=dict(os.environ, PYTHONPATH=cwd))
+    try:
+        for _ in range(3):
+            assert wait_for(f"http://127.0.0.1:{port}/hello") == b"hello"
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(15) == 0
+    assert log_path.read_text().count('"route":"/hello"') == 3
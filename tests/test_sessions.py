@@ -0,0 +1,134 @@
+import pytest
+from osa import session, abort
+from osa.globals import response
+from osa.sessions import (
+    Session, SessionStore, SignedCookieSessionStore, MemorySessionStore, SQLiteSessionStore,
+)
+
+
+def counter_routes(app):
+    @app.route("/count")
+    def count():
+        session["count"] = session.get("count", 0) + 1
+        response.text = str(session["count"])
+
+    @app.route("/read")
+    def read():
+        response.text = str(session.get("count"))
+
+    @app.route("/logout")
+    def logout():
+        session.clear()
+
+    @app.route("/untouched")
+    def untouched():
+        response.text = "hello"
+
+
+@pytest.fixture(params=["cookie", "memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "cookie":
+        return SignedCookieSessionStore(secret_key="secret")
+    if request.param == "memory":
+        return MemorySessionStore()
+    return SQLiteSessionStore(path=str(tmp_path / "sessions.sqlite3"))
+
+
+def test_session_round_trip(app, client, store):
+    store.init_app(app)
+    counter_routes(app)
+    assert client.get("/count").text == "1"
+    assert client.get("/count").text == "2"
+    res = client.get("/read")
+    assert res.text == "2"
+    # Reading does not write the session back
+    assert "Set-Cookie" not in res.headers
+    client.get("/logout")
+    assert "osa_session" not in client.cookies
+    assert client.get("/read").text == "None"
+
+
+def test_session_is_lazy(app, client, store):
+    store.init_app(app)
+    counter_routes(app)
+    opened = []
+    original = store.open
+    store.open = lambda request: opened.append(1) or original(request)
+    client.get("/count")
+    res = client.get("/untouched")
+    assert res.text == "hello"
+    assert "Set-Cookie" not in res.headers
+    assert len(opened) == 1
+
+
+def test_session_saved_on_error(app, client):
+    MemorySessionStore(app)
+
+    @app.route("/denied")
+    def denied():
+        session["denied"] = True
+        abort(403)
+
+    @app.route("/check")
+    def check():
+        response.text = str(session.get("denied"))
+
+    assert client.get("/denied").status_code == 403
+    assert client.get("/check").text == "True"
+
+
+def test_signed_cookie_tampering(app, client):
+    store = SignedCookieSessionStore(app, secret_key="secret")
+    counter_routes(app)
+    client.get("/count")
+    value = client.cookies["osa_session"]
+    assert store.loads(value) == {"count": 1}
+    payload, timestamp, signature = value.split(".")
+    forged = store.dumps({"count": 100}).split(".")[0]
+    assert store.loads(f"{forged}.{timestamp}.{signature}") is None
+    assert client.get("/read", cookies={"osa_session": f"{forged}.{timestamp}.{signature}"}).text == "None"
+    assert SignedCookieSessionStore(secret_key="other").loads(value) is None
+    # A non-ASCII signature is rejected, not a 500
+    assert store.loads("eyJhIjoxfQ.1.\u00e9") is None
+    res = client.get("/read", headers={"Cookie": 'osa_session="eyJhIjoxfQ.1.\\303\\251"'})
+    assert res.status_code == 200
+    assert res.text == "None"
+
+
+def test_signed_cookie_expires():
+    store = SignedCookieSessionStore(secret_key="secret", max_age=-1)
+    assert store.loads(store.dumps({"a": 1})) is None
+    with pytest.raises(ValueError):
+        SignedCookieSessionStore()
+
+
+def test_memory_store_lru_and_ttl():
+    store = MemorySessionStore(max_entries=2)
+    store.store("a", {"n": 1})
+    store.store("b", {"n": 2})
+    store.load("a")
+    store.store("c", {"n": 3})
+    assert store.load("b") is None
+    assert store.load("a") == {"n": 1}
+    expired = MemorySessionStore(max_age=-1)
+    expired.store("a", {"n": 1})
+    assert expired.load("a") is None
+
+
+def test_session_tracks_changes():
+    s = Session({"a": 1}, new=False)
+    assert not s.modified
+    s.get("a")
+    assert not s.modified
+    s.setdefault("b", 2)
+    assert s.modified
+
+
+def test_session_without_store(app, client):
+    @app.route("/")
+    def home():
+        session["x"] = 1
+
+    assert client.get("/").status_code == 500
+    with pytest.raises(NotImplementedError):
+        SessionStore().open(None)
@@ -0,0 +1,102 @@
+import json
+import time
+import pytest
+from osa.globals import request, response
+from osa.testing import build_environ
+
+
+def test_build_environ():
+    environ = build_environ("post", "http://example.com:8080/a%20b?x=1", {"Content-Type": "text/plain", "X-Token": "t"}, b"hi")
+    assert environ["REQUEST_METHOD"] == "POST"
+    assert environ["PATH_INFO"] == "/a b"
+    assert environ["QUERY_STRING"] == "x=1"
+    assert environ["SERVER_NAME"] == "example.com"
+    assert environ["SERVER_PORT"] == "8080"
+    assert environ["CONTENT_TYPE"] == "text/plain"
+    assert environ["CONTENT_LENGTH"] == "2"
+    assert environ["HTTP_X_TOKEN"] == "t"
+    assert environ["wsgi.input"].read() == b"hi"
+
+
+def test_non_ascii_url(app, client):
+    @app.route("/{name}")
+    def echo(name):
+        response.text = f"{name} {request.GET.get('q')}"
+
+    assert build_environ("GET", "/café")["PATH_INFO"] == "/caf\xc3\xa9"
+    res = client.get("/café?q=thé")
+    assert res.status_code == 200
+    assert res.text == "café thé"
+    assert client.get("/caf%C3%A9").text == "café None"
+
+
+def test_json_form_and_params(app, client):
+    @app.route("/echo", methods=["POST"])
+    def echo():
+        response.content_type = "application/json"
+        response.text = json.dumps({
+            "json": request.json if request.content_type == "application/json" else None,
+            "form": dict(request.POST),
+            "query": dict(request.GET),
+        })
+
+    res = client.post("/echo", json={"a": 1}, params={"q": "osa"})
+    assert res.status_code == 200
+    assert res.json() == {"json": {"a": 1}, "form": {}, "query": {"q": "osa"}}
+    assert client.post("/echo", data={"name": "osa"}).json()["form"] == {"name": "osa"}
+
+
+def test_cookies_are_kept(app, client):
+    @app.route("/login")
+    def login():
+        response.set_cookie("user", "osa")
+
+    @app.route("/whoami")
+    def whoami():
+        response.text = request.cookies.get("user", "anonymous")
+
+    @app.route("/logout")
+    def logout():
+        response.delete_cookie("user")
+
+    assert client.get("/whoami").text == "anonymous"
+    assert client.get("/login").cookies == {"user": "osa"}
+    assert client.get("/whoami").text == "osa"
+    client.get("/logout")
+    assert client.get("/whoami").text == "anonymous"
+
+
+def test_redirect_sends_new_cookies(app, client):
+    @app.route("/login", methods=["POST"])
+    def login():
+        response.status = 307
+        response.location = "/account"
+        response.set_cookie("user", "osa")
+
+    @app.route("/account", methods=["POST"])
+    def account():
+        response.text = f"{request.cookies.get('user')} {request.cookies.get('theme')}"
+
+    client.cookies["theme"] = "dark"
+    assert client.post("/login", follow_redirects=True).text == "osa dark"
+
+
+def test_concurrent_requests_are_isolated(app, client):
+    @app.route("/echo/{value}")
+    def echo(value):
+        time.sleep(0.001)
+        response.text = request.path.rsplit("/", 1)[1]
+
+    urls = [("GET", f"/echo/{i}") for i in range(200)]
+    responses = client.concurrent(urls, threads=16)
+    assert [res.text for res in responses] == [str(i) for i in range(200)]
+
+
+def test_test_session_still_works(app):
+    pytest.importorskip("wsgiadapter")
+
+    @app.route("/hello")
+    def hello():
+        response.text = "hello"
+
+    assert app.test_session().get("http://testserver/hello").text == "hello"